@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
-from database.user import get_user_by_email, create_user, get_user_by_id
-from utils.auth_utils import hash_password, verify_password, create_token, get_current_user
+from database.user import get_user_by_email, create_user, get_user_by_id, update_password_hash
+from utils.auth_utils import ahash_password, averify_password, needs_rehash, create_token, get_current_user
 
 router = APIRouter()
 
@@ -21,7 +21,7 @@ async def signup(request: SignupRequest):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = hash_password(request.password)
+    hashed_pw = await ahash_password(request.password)
     user_id = await create_user(request.name, request.email, hashed_pw)
     token = create_token(user_id)
     return {"token": token}
@@ -29,8 +29,10 @@ async def signup(request: SignupRequest):
 @router.post("/login")
 async def login(request: LoginRequest):
     user = await get_user_by_email(request.email)
-    if not user or not verify_password(request.password, user["hashed_password"]):
+    if not user or not await averify_password(request.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if needs_rehash(user["hashed_password"]):
+        await update_password_hash(user["_id"], await ahash_password(request.password))
 
     token = create_token(str(user["_id"]))
     
@@ -1,25 +1,41 @@
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, Path
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, Path, Query, Request
 from pydantic import BaseModel, EmailStr
+import json
+import logging
 import os
 from database.__init__ import history_collection
 from fastapi import UploadFile, File, Form
-from fastapi.responses import JSONResponse
-from database.user import get_user_by_email, create_user, get_user_by_id
+from fastapi.responses import JSONResponse, StreamingResponse
+from database.user import get_user_by_email, create_user, get_user_by_id, update_password_hash
 from utils.auth_utils import (
-    hash_password,
-    verify_password,
+    ahash_password,
+    averify_password,
+    needs_rehash,
     create_token,
-    get_current_user
+    get_current_user,
+    get_current_claims,
+    get_optional_user,
+    invalidate_user
 )
 from bson import ObjectId
 from fastapi.responses import JSONResponse
 
-from ml.summarizer import summarize_text
-from ml.quiz_generator import generate_quiz_questions
-from ml.db import save_summary_history, get_user_history
-from ml.chat_engine import upload_and_index_pdf_for_chat, chat_with_ai
+from ml.summarizer import summarize_text, stream_summary, SUMMARY_MODES
+from ml.quiz_generator import generate_quiz_questions, format_question
+from ml.db import save_summary_history, save_chat_history, list_history, get_history_item, HISTORY_PAGE_SIZE
+from ml.chat_engine import upload_and_index_pdf_for_chat, remove_pdf_from_chat, chat_with_ai, stream_chat
+from ml.chat_sessions import DOCUMENT_ID_PATTERN
 from ml.flashcard_generator import generate_flashcards 
-from ml.db import save_flashcard_history, get_flashcard_history
+from ml.db import save_flashcard_history
+from ml.jobs import submit_job, get_job, wait_for_job
+from ml.documents import store_upload
+from database.document import get_document
+from utils.file_utils import save_upload_stream
+from utils.rate_limit import admit_request
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_PIC_BYTES = int(os.getenv("MAX_PROFILE_PIC_BYTES", str(5 * 1024 * 1024)))
 
 router = APIRouter()
 
@@ -52,7 +68,7 @@ async def signup(request: SignupRequest):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = hash_password(request.password)
+    hashed_pw = await ahash_password(request.password)
     user_info = await create_user(request.name, request.email, hashed_pw)
     
     token = create_token(user_info["user_id"])
@@ -65,8 +81,10 @@ async def signup(request: SignupRequest):
 @router.post("/login")
 async def login(request: LoginRequest):
     user = await get_user_by_email(request.email)
-    if not user or not verify_password(request.password, user["hashed_password"]):
+    if not user or not await averify_password(request.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if needs_rehash(user["hashed_password"]):
+        await update_password_hash(user["_id"], await ahash_password(request.password))
 
     token = create_token(str(user["_id"]))
     return {
@@ -77,60 +95,94 @@ async def login(request: LoginRequest):
 
 
 
+def _user_id(user):
+    return str(user["_id"]) if user else None
+
+
 @router.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    file_path = os.path.join(upload_dir, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+async def upload_pdf(file: UploadFile = File(...), user=Depends(get_optional_user)):
+    document = await store_upload(file, owner_id=_user_id(user))
 
-    return {"message": f"{file.filename} uploaded successfully"}
+    return {"message": f"{file.filename} uploaded successfully", "document_id": str(document["_id"])}
 
 
-@router.post("/summarize")
-async def summarize():
-    upload_dir = "uploads"
-    uploaded_files = os.listdir(upload_dir)
+async def _resolve_document(document_id, user):
+    # The id returned by /upload; there is no implicit "latest upload" to fall back to
+    if not document_id:
+        raise HTTPException(status_code=400, detail="document_id is required")
+    document = await get_document(document_id, _user_id(user))
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
 
-    if not uploaded_files:
-        raise HTTPException(status_code=400, detail="No uploaded PDF found.")
 
-    latest_file = max(
-        [os.path.join(upload_dir, f) for f in uploaded_files if f.endswith(".pdf")],
-        key=os.path.getmtime
-    )
+@router.post("/summarize")
+async def summarize(request: Request, mode: str = Form("auto"), document_id: str = Form(...), user=Depends(get_optional_user)):
+    if mode not in SUMMARY_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SUMMARY_MODES)}")
 
-    print(" Latest file to summarize:", latest_file)
+    document = await _resolve_document(document_id, user)
+    admit_request(request, user)
+
+    logger.debug("Summarizing document %s (%s)", document["_id"], document["file_name"])
 
     try:
-        summary = summarize_text(latest_file)
+        summary = await summarize_text(document["path"], mode=mode)
         return {"summary": summary}
+    except HTTPException:
+        raise
     except Exception as e:
-        print("🔥 ERROR in /summarize:", e)
+        logger.exception("Summarization failed for document %s", document["_id"])
         raise HTTPException(status_code=500, detail="Summarization failed")
 
 
 
-@router.post("/quiz")
-async def quiz():
-    upload_dir = "uploads"
-    uploaded_files = os.listdir(upload_dir)
+def _sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _sse_response(tokens, on_complete):
+    async def events():
+        parts = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield _sse({"token": token})
+        except Exception as e:
+            yield _sse({"error": str(e)})
+            return
+        await on_complete("".join(parts).strip())
+        yield _sse({"done": True})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.post("/summarize/stream")
+async def summarize_stream(request: Request, mode: str = Form("auto"), document_id: str = Form(...), user=Depends(get_current_user)):
+    if mode not in SUMMARY_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SUMMARY_MODES)}")
 
-    if not uploaded_files:
-        raise HTTPException(status_code=400, detail="No uploaded PDF found.")
+    document = await _resolve_document(document_id, user)
+    admit_request(request, user)
 
-    latest_file = max(
-        [os.path.join(upload_dir, f) for f in uploaded_files if f.endswith(".pdf")],
-        key=os.path.getmtime
-    )
+    async def save(summary):
+        await save_summary_history(str(user["_id"]), document["file_name"], summary)
 
-    print("📄 Latest file to quiz:", latest_file)
+    return _sse_response(stream_summary(document["path"], mode=mode), save)
+
+
+@router.post("/quiz")
+async def quiz(request: Request, document_id: str = Form(...), user=Depends(get_optional_user)):
+    document = await _resolve_document(document_id, user)
+    admit_request(request, user)
+
+    logger.debug("Generating quiz for document %s (%s)", document["_id"], document["file_name"])
 
     try:
-        questions = generate_quiz_questions(latest_file, num_questions=5)
-        return {"quiz": questions}
+        questions = await generate_quiz_questions(document["path"], num_questions=5)
+        return {"quiz": [format_question(q) for q in questions], "questions": questions}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Quiz generation failed: {str(e)}")
 
@@ -151,23 +203,52 @@ async def save_quiz_history_route(data: dict, user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Failed to save quiz history: {str(e)}")
 
 
+def _check_document_id(document_id):
+    if document_id is not None and not DOCUMENT_ID_PATTERN.match(document_id):
+        raise HTTPException(status_code=400, detail="Invalid document_id")
+
+
 @router.post("/chat/upload")
-async def upload_chat_pdf(file: UploadFile = File(...)):
+async def upload_chat_pdf(file: UploadFile = File(...), user=Depends(get_current_user)):
     try:
-        path = upload_and_index_pdf_for_chat(file)
-        return {"message": f"{file.filename} uploaded and indexed."}
+        document_id = await upload_and_index_pdf_for_chat(file, user_id=_user_id(user))
+        return {"message": f"{file.filename} uploaded and indexed.", "document_id": document_id}
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@router.delete("/chat/documents/{document_id}")
+async def remove_chat_pdf(document_id: str, user=Depends(get_current_user)):
+    _check_document_id(document_id)
+    if not await remove_pdf_from_chat(document_id, user_id=_user_id(user)):
+        raise HTTPException(status_code=404, detail="Document is not in the chat index")
+    return {"message": "Document removed from chat index"}
+
 @router.post("/chat")
-async def chat_endpoint(query: str = Form(...)):
+async def chat_endpoint(request: Request, query: str = Form(...), document_id: str = Form(None), user=Depends(get_current_user)):
+    _check_document_id(document_id)
+    admit_request(request, user)
     try:
-        answer = chat_with_ai(query)
+        answer = await chat_with_ai(query, user_id=_user_id(user), document_id=document_id)
         return {"response": answer}
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
     
 
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: Request, query: str = Form(...), document_id: str = Form(None), user=Depends(get_current_user)):
+    _check_document_id(document_id)
+    admit_request(request, user)
+
+    async def save(answer):
+        await save_chat_history(str(user["_id"]), query, answer)
+
+    return _sse_response(stream_chat(query, user_id=_user_id(user), document_id=document_id), save)
+
+
 @router.post("/history/summarize")
 async def save_summarize_history(data: dict, user=Depends(get_current_user)):
     try:
@@ -184,38 +265,44 @@ async def save_summarize_history(data: dict, user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Failed to save history: {str(e)}")
     
 
-@router.get("/history")
-async def get_history(user=Depends(get_current_user)):
+async def _history_page(user, item_type, limit, cursor):
     try:
-        user_id = str(user["_id"])
-        history = await get_user_history(user_id)
-
-        # Convert ObjectId and timestamp for frontend compatibility
-        cleaned = []
-        for item in history:
-            item["_id"] = str(item["_id"])
-            if "timestamp" in item:
-                item["timestamp"] = item["timestamp"].isoformat()
-            cleaned.append(item)
-
-        return {"history": cleaned}
+        items, next_cursor = await list_history(str(user["_id"]), item_type, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
+
+    # Convert ObjectId and timestamp for frontend compatibility
+    for item in items:
+        item["_id"] = str(item["_id"])
+        if "timestamp" in item:
+            item["timestamp"] = item["timestamp"].isoformat()
+    return {"history": items, "next_cursor": next_cursor}
+
+@router.get("/history")
+async def get_history(
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_SIZE),
+    cursor: str = Query(None),
+    item_type: str = Query(None, alias="type", regex="^(summarizer|quiz|flashcards|chat)$"),
+    user=Depends(get_current_claims),
+):
+    return await _history_page(user, item_type, limit, cursor)
     
     
 @router.get("/history/summarizer/{item_id}")
-async def download_summary(item_id: str, user=Depends(get_current_user)):
-    doc = await history_collection.find_one({"_id": ObjectId(item_id), "user_id": str(user["_id"]), "type": "summarizer"})
-    if not doc:
+async def download_summary(item_id: str, user=Depends(get_current_claims)):
+    summary = await get_history_item(str(user["_id"]), "summarizer", item_id)
+    if summary is None:
         raise HTTPException(status_code=404, detail="Summary not found")
-    return {"summary": doc["summary"]}
+    return {"summary": summary}
 
 @router.get("/history/quiz/{item_id}")
-async def download_quiz(item_id: str, user=Depends(get_current_user)):
-    doc = await history_collection.find_one({"_id": ObjectId(item_id), "user_id": str(user["_id"]), "type": "quiz"})
-    if not doc:
+async def download_quiz(item_id: str, user=Depends(get_current_claims)):
+    quiz = await get_history_item(str(user["_id"]), "quiz", item_id)
+    if quiz is None:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    return {"quiz": doc["quiz"]}
+    return {"quiz": quiz}
 
 @router.delete("/history/{item_type}/{item_id}")
 async def delete_history_item(
@@ -238,17 +325,15 @@ async def delete_history_item(
 
 
 @router.post("/generate_flashcards/")
-async def generate_flashcard_api(file: UploadFile = File(...), num_questions: int = Form(...)):
+async def generate_flashcard_api(request: Request, file: UploadFile = File(...), num_questions: int = Form(...), user=Depends(get_optional_user)):
+    admit_request(request, user)
     try:
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        file_path = os.path.join(upload_dir, file.filename)
+        document = await store_upload(file, owner_id=_user_id(user))
 
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
-
-        flashcards = generate_flashcards(file_path, num_cards=num_questions)
+        flashcards = await generate_flashcards(document["path"], num_cards=num_questions)
         return {"flashcards": flashcards}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Flashcard generation failed: {str(e)}")
     
@@ -267,38 +352,21 @@ async def save_flashcard_history_route(data: dict, user=Depends(get_current_user
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save flashcard history: {str(e)}")
 @router.get("/history/flashcards")
-async def get_flashcard_history_route(user=Depends(get_current_user)):
-    try:
-        user_id = str(user["_id"])
-        data = await get_flashcard_history(user_id)
-
-        cleaned = []
-        for item in data:
-            item["_id"] = str(item["_id"])
-            if "timestamp" in item:
-                item["timestamp"] = item["timestamp"].isoformat()
-            cleaned.append(item)
-
-        return {"history": cleaned}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch flashcard history: {str(e)}")
+async def get_flashcard_history_route(
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_SIZE),
+    cursor: str = Query(None),
+    user=Depends(get_current_claims),
+):
+    return await _history_page(user, "flashcards", limit, cursor)
 
 
 @router.get("/history/flashcards/{item_id}")
-async def get_flashcards_by_id(item_id: str, user=Depends(get_current_user)):
-    from database.__init__ import history_collection
-    from bson import ObjectId
-
-    doc = await history_collection.find_one({
-        "_id": ObjectId(item_id),
-        "user_id": str(user["_id"]),
-        "type": "flashcards"
-    })
-
-    if not doc:
+async def get_flashcards_by_id(item_id: str, user=Depends(get_current_claims)):
+    flashcards = await get_history_item(str(user["_id"]), "flashcards", item_id)
+    if flashcards is None:
         raise HTTPException(status_code=404, detail="Flashcards not found")
 
-    return {"flashcards": doc["flashcards"]}
+    return {"flashcards": flashcards}
 
 
 
@@ -316,20 +384,79 @@ async def update_profile(data: dict, user=Depends(get_current_user)):
     if "name" in data:
         update_fields["name"] = data["name"]
     if "password" in data and data["password"]:
-        from utils.auth_utils import hash_password
-        update_fields["hashed_password"] = hash_password(data["password"])
+        update_fields["hashed_password"] = await ahash_password(data["password"])
     if "profile_pic" in data:
         update_fields["profile_pic"] = data["profile_pic"]
 
     if update_fields:
         from database.__init__ import users_collection
         await users_collection.update_one({"_id": user["_id"]}, {"$set": update_fields})
+        invalidate_user(user["_id"])
     return {"message": "Profile updated"}
 
 
 @router.post("/upload-profile-pic")
 async def upload_pic(file: UploadFile = File(...), user=Depends(get_current_user)):
     path = f"uploads/profile_{user['_id']}.png"
-    with open(path, "wb") as f:
-        f.write(await file.read())
+    tmp_path, _, _ = await save_upload_stream(file, "uploads", max_bytes=MAX_PROFILE_PIC_BYTES)
+    os.replace(tmp_path, path)
+    invalidate_user(user["_id"])
     return {"url": f"http://localhost:8000/{path}"}
+
+
+# =========================
+# Background jobs
+# =========================
+
+@router.post("/jobs/{kind}")
+async def submit_job_route(
+    request: Request,
+    kind: str = Path(..., regex="^(summarize|quiz|flashcards)$"),
+    file: UploadFile = File(None),
+    document_id: str = Form(None),
+    mode: str = Form("auto"),
+    num_questions: int = Form(5),
+    priority: int = Form(0),
+    user=Depends(get_current_user)
+):
+    if kind == "summarize" and mode not in SUMMARY_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SUMMARY_MODES)}")
+    # Jobs wait in their own queue, so only the per-caller rate limit applies
+    admit_request(request, user, queue=False)
+
+    if file is not None:
+        document = await store_upload(file, owner_id=_user_id(user))
+    else:
+        document = await _resolve_document(document_id, user)
+
+    params = {
+        "document_id": str(document["_id"]),
+        "file_path": document["path"],
+        "file_name": document["file_name"],
+        "file_hash": document["sha256"],
+    }
+    if kind == "summarize":
+        params["mode"] = mode
+    else:
+        params["num_questions"] = num_questions
+
+    job_id, created = await submit_job(kind, str(user["_id"]), params, priority=priority)
+    return JSONResponse(status_code=202 if created else 200, content={"job_id": job_id, "deduplicated": not created})
+
+
+async def _get_owned_job(job_id: str, user):
+    job = await get_job(job_id)
+    if not job or job["user_id"] != str(user["_id"]):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_route(job_id: str, user=Depends(get_current_claims)):
+    return await _get_owned_job(job_id, user)
+
+
+@router.get("/jobs/{job_id}/wait")
+async def wait_for_job_route(job_id: str, timeout: float = 30, user=Depends(get_current_claims)):
+    await _get_owned_job(job_id, user)
+    return await wait_for_job(job_id, timeout=min(max(timeout, 0), 60))
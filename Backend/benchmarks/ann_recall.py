@@ -0,0 +1,55 @@
+"""Recall/latency report for the FAISS index types.
+
+    python -m benchmarks.ann_recall                      # synthetic vectors
+    python -m benchmarks.ann_recall --index chat_vectorstore/<user>
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml import ann  # noqa: E402
+
+
+def _stored_vectors(index_path):
+    from ml.index_manager import generation_dir
+
+    gen_dir = generation_dir(index_path)
+    if gen_dir is None:
+        raise SystemExit(f"No index committed at {index_path}")
+    return ann.reconstruct_all(ann.read_index(os.path.join(gen_dir, "index.faiss")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index", help="index directory to sample vectors from")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--kinds", default=",".join(ann.INDEX_KINDS))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.index:
+        vectors = _stored_vectors(args.index)
+    else:
+        vectors = rng.standard_normal((args.vectors, args.dim)).astype(np.float32)
+    # Held-out queries: perturbed copies of stored vectors
+    picks = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.1 * rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'kind':<10}{'recall@k':>10}{'ms/query':>10}{'build s':>10}{'bytes/vec':>11}")
+    for row in ann.recall_report(vectors, queries, args.k, args.kinds.split(",")):
+        print(
+            f"{row['kind']:<10}{row['recall_at_k']:>10.3f}{row['ms_per_query']:>10.3f}"
+            f"{row['build_seconds']:>10.2f}{row['bytes_per_vector']:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
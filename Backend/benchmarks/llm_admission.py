@@ -0,0 +1,81 @@
+"""Burst of LLM calls through admission control against the fake provider.
+
+    python -m benchmarks.llm_admission --requests 200 --concurrency 8 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def configure(args):
+    # Read at import time by the modules below
+    os.environ.update({
+        "LLM_PROVIDER": "fake",
+        "LLM_CACHE_ENABLED": "0",
+        "LLM_CONCURRENCY": str(args.concurrency),
+        "LLM_MAX_QUEUE": str(args.max_queue),
+        "LLM_QUEUE_DEADLINE_SECONDS": str(args.deadline),
+        "FAKE_LLM_LATENCY_MS": str(args.latency_ms),
+        "FAKE_LLM_ERROR_RATE": str(args.error_rate),
+    })
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run(args):
+    from fastapi import HTTPException
+
+    from ml import llm
+    from utils.rate_limit import check_capacity, rejections
+
+    async def call(i):
+        started = time.perf_counter()
+        try:
+            check_capacity(args.deadline)
+            await llm.generate([("human", f"Question {i}")])
+            return "ok", time.perf_counter() - started
+        except HTTPException as e:
+            return f"shed_{e.status_code}", time.perf_counter() - started
+        except Exception:
+            return "failed", time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(call(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds for outcome, seconds in results if outcome == "ok"]
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    client = llm.get_client()
+    print(f"{args.requests} requests in {elapsed:.2f}s, {args.concurrency} slots, deadline {args.deadline}s")
+    print("outcomes:", ", ".join(f"{name}={count}" for name, count in sorted(outcomes.items())))
+    print(f"provider calls={client.calls} errors={client.failures} retries={int(llm.llm_retries.value())}")
+    print("shed by reason:", {reason: int(rejections.value(reason=reason)) for reason in ("queue_full", "deadline")})
+    print(f"admitted latency p50={percentile(latencies, 0.5):.3f}s p95={percentile(latencies, 0.95):.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--deadline", type=float, default=5)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    configure(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
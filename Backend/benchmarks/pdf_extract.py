@@ -0,0 +1,63 @@
+"""Pages/second of each PDF extraction backend on a synthetic corpus.
+
+    python -m benchmarks.pdf_extract --files 8 --pages 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml.pdf_extract import PDF_EXTRACT_WORKERS, iter_pages, shutdown_pool  # noqa: E402
+
+PARAGRAPH = (
+    "Section {page}.{line}: The Navier-Stokes equations describe viscous flow; "
+    "see Eq. ({line}) and the RMS error in Table {page}. "
+)
+
+
+def make_corpus(directory, files, pages):
+    import fitz
+
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"synthetic-{i}.pdf")
+        with fitz.open() as pdf:
+            for page in range(pages):
+                text = "".join(PARAGRAPH.format(page=page, line=line) for line in range(40))
+                pdf.new_page().insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=8)
+            pdf.save(path)
+        paths.append(path)
+    return paths
+
+
+def measure(paths, backend, workers):
+    started = time.perf_counter()
+    pages = sum(1 for path in paths for _ in iter_pages(path, backend=backend, workers=workers))
+    return pages, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=PDF_EXTRACT_WORKERS)
+    args = parser.parse_args()
+
+    runs = [("pypdf", 1), ("pymupdf", 1), ("pymupdf", args.workers)]
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_corpus(directory, args.files, args.pages)
+        # Start the worker processes outside the timed runs
+        measure(paths[:1], "pymupdf", args.workers)
+        print(f"{args.files} files x {args.pages} pages")
+        print(f"{'backend':<10}{'workers':>8}{'pages':>8}{'seconds':>10}{'pages/s':>10}")
+        for backend, workers in runs:
+            pages, seconds = measure(paths, backend, workers)
+            print(f"{backend:<10}{workers:>8}{pages:>8}{seconds:>10.2f}{pages / seconds:>10.1f}")
+    shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
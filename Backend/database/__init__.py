@@ -1,12 +1,8 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from .lifecycle import HISTORY_WRITE_CONCERN, MONGO_DB_NAME, MONGO_URI, client
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URI)
-
-db = client["ai_tutor"]
+db = client[MONGO_DB_NAME]
 
 users_collection = db["users"]
 documents_collection = db["documents"]
 chunks_collection = db["chunks"]
-history_collection = db["history"]
+history_collection = db.get_collection("history", write_concern=HISTORY_WRITE_CONCERN)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from . import documents_collection
+from utils.metrics import timed
+
+
+@timed("mongo", operation="register_document")
+async def register_document(owner_id, file_name: str, sha256: str, size: int, page_count: int, path: str):
+    # One record per owner and content; uploading the same bytes again only refreshes it
+    fields = {"file_name": file_name, "size": size, "path": path, "uploaded_at": datetime.utcnow()}
+    if page_count is not None:  # None: not parsed yet, keep any count already recorded
+        fields["page_count"] = page_count
+    return await documents_collection.find_one_and_update(
+        {"owner_id": owner_id, "sha256": sha256},
+        {"$set": fields, "$setOnInsert": {"artifacts": {}}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+@timed("mongo", operation="get_document")
+async def get_document(document_id: str, owner_id=None):
+    try:
+        _id = ObjectId(document_id)
+    except (InvalidId, TypeError):
+        return None
+    # Signed-in callers reach their own documents; anonymous uploads have no
+    # owner and are reachable only by whoever holds the id /upload returned
+    owners = [None] if owner_id is None else [owner_id, None]
+    return await documents_collection.find_one({"_id": _id, "owner_id": {"$in": owners}})
+
+
+@timed("mongo", operation="update_document")
+async def update_document(document_id, fields: dict):
+    await documents_collection.update_one({"_id": ObjectId(document_id)}, {"$set": fields})
+
+
+@timed("mongo", operation="set_artifact")
+async def set_artifact(document_id, name: str, value):
+    await documents_collection.update_one(
+        {"_id": ObjectId(document_id)},
+        {"$set": {f"artifacts.{name}": value}},
+    )
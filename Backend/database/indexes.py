@@ -0,0 +1,26 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from . import users_collection, documents_collection, history_collection
+
+logger = logging.getLogger(__name__)
+
+# (collection, keys, options); create_index is a no-op when the index already exists
+INDEXES = [
+    # History lists: one user's items, optionally of one type, newest first, with _id as tie-breaker for cursors
+    (history_collection, [("user_id", ASCENDING), ("type", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {}),
+    (history_collection, [("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {}),
+    (users_collection, [("email", ASCENDING)], {"unique": True}),
+    (documents_collection, [("owner_id", ASCENDING), ("sha256", ASCENDING)], {"unique": True}),
+]
+
+
+async def ensure_indexes():
+    for collection, keys, options in INDEXES:
+        try:
+            await collection.create_index(keys, **options)
+        except OperationFailure as e:
+            # e.g. duplicate emails already stored; the app still works without the index
+            logger.error("Could not create index %s on %s: %s", keys, collection.name, e)
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import threading
+
+from pymongo import monitoring
+from pymongo.write_concern import WriteConcern
+
+from utils.metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "ai_tutor")
+# Size per uvicorn worker: total connections = workers * MONGO_MAX_POOL_SIZE
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+# Fail fast instead of hanging when Mongo is unreachable or slow
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "3000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_READY_TIMEOUT_SECONDS = float(os.getenv("MONGO_READY_TIMEOUT_SECONDS", "1"))
+# History entries are regenerable, so they default to an unjournaled primary ack
+HISTORY_WRITE_CONCERN = WriteConcern(
+    w=int(os.getenv("MONGO_HISTORY_W", "1")),
+    j=os.getenv("MONGO_HISTORY_JOURNAL", "0") == "1",
+)
+# "1" swaps in mongomock-motor (tests and local runs without a mongod)
+MONGO_MOCK = os.getenv("MONGO_MOCK", "0") == "1"
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out connections per server from pymongo's pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = {}
+        self.checked_out = {}
+
+    @staticmethod
+    def _key(address):
+        return f"{address[0]}:{address[1]}"
+
+    def _add(self, counts, address, delta):
+        key = self._key(address)
+        with self._lock:
+            counts[key] = max(0, counts.get(key, 0) + delta)
+
+    def connection_created(self, event):
+        self._add(self.open, event.address, 1)
+
+    def connection_closed(self, event):
+        self._add(self.open, event.address, -1)
+
+    def connection_checked_out(self, event):
+        self._add(self.checked_out, event.address, 1)
+
+    def connection_checked_in(self, event):
+        self._add(self.checked_out, event.address, -1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.checked_out[self._key(event.address)] = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            servers = set(self.open) | set(self.checked_out)
+            return {
+                server: {
+                    "open": self.open.get(server, 0),
+                    "checked_out": self.checked_out.get(server, 0),
+                    "max_pool_size": MONGO_MAX_POOL_SIZE,
+                    "utilization": self.checked_out.get(server, 0) / MONGO_MAX_POOL_SIZE,
+                }
+                for server in sorted(servers)
+            }
+
+
+pool_monitor = PoolMonitor()
+register_gauge(
+    "ai_tutor_mongo_pool_checked_out",
+    "Mongo connections currently checked out, per server.",
+    lambda: {(("server", server),): stats["checked_out"] for server, stats in pool_monitor.snapshot().items()},
+)
+register_gauge(
+    "ai_tutor_mongo_pool_open",
+    "Mongo connections currently open, per server.",
+    lambda: {(("server", server),): stats["open"] for server, stats in pool_monitor.snapshot().items()},
+)
+
+
+def create_client(uri=MONGO_URI):
+    if MONGO_MOCK:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError as e:
+            raise RuntimeError("MONGO_MOCK=1 needs the mongomock-motor package (pip install mongomock-motor)") from e
+        return AsyncMongoMockClient()
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    # Motor connects lazily, so creating the client at import time does no I/O
+    return AsyncIOMotorClient(
+        uri,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[pool_monitor],
+    )
+
+
+client = create_client()
+
+
+async def ping(timeout=MONGO_READY_TIMEOUT_SECONDS):
+    await asyncio.wait_for(client.admin.command("ping"), timeout)
+
+
+async def connect():
+    """Check Mongo is reachable and open MONGO_MIN_POOL_SIZE connections before traffic arrives."""
+    try:
+        # Concurrent pings each need their own connection, which fills the pool
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE))))
+    except Exception as e:
+        # Keep starting: /readyz reports not-ready until Mongo answers
+        logger.error("MongoDB is not reachable at startup: %s", e)
+        return False
+    return True
+
+
+def close():
+    client.close()
+
+
+async def readiness():
+    """(ready, details) for /readyz."""
+    try:
+        await ping()
+        error = None
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    details = {"mongo": "ok" if error is None else error, "pool": pool_monitor.snapshot()}
+    return error is None, details
@@ -1,6 +1,11 @@
 from . import users_collection
 from bson.objectid import ObjectId
+from utils.metrics import timed
 
+# Fields never needed to authorize or describe a request
+PROFILE_PROJECTION = {"hashed_password": 0}
+
+@timed("mongo", operation="create_user")
 async def create_user(name: str, email: str, hashed_password: str):
     user = {
         "name": name,
@@ -13,8 +18,18 @@ async def create_user(name: str, email: str, hashed_password: str):
         "name": name
     }
 
+@timed("mongo", operation="update_password_hash")
+async def update_password_hash(user_id, hashed_password: str):
+    await users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"hashed_password": hashed_password}})
+
+@timed("mongo", operation="get_user_by_email")
 async def get_user_by_email(email: str):
     return await users_collection.find_one({"email": email})
 
+@timed("mongo", operation="get_user_by_id")
 async def get_user_by_id(user_id: str):
     return await users_collection.find_one({"_id": ObjectId(user_id)})
+
+@timed("mongo", operation="get_user_profile")
+async def get_user_profile(user_id: str):
+    return await users_collection.find_one({"_id": ObjectId(user_id)}, PROFILE_PROJECTION)
@@ -0,0 +1,183 @@
+import math
+import os
+import time
+
+import numpy as np
+
+# "auto" picks a flat index for small corpora, FAISS_MEDIUM_INDEX in the
+# middle, and IVF-PQ for large ones; any other value pins the index type.
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+FAISS_MEDIUM_INDEX = os.getenv("FAISS_MEDIUM_INDEX", "hnsw")
+FAISS_FLAT_MAX = int(os.getenv("FAISS_FLAT_MAX", "50000"))
+FAISS_IVF_PQ_MIN = int(os.getenv("FAISS_IVF_PQ_MIN", "1000000"))
+
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+FAISS_PQ_BITS = int(os.getenv("FAISS_PQ_BITS", "8"))
+FAISS_TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+
+INDEX_KINDS = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+_TIER = {"flat": 0, "hnsw": 1, "ivf_flat": 1, "ivf_pq": 2}
+
+if FAISS_INDEX_TYPE != "auto" and FAISS_INDEX_TYPE not in INDEX_KINDS:
+    raise ValueError(f"FAISS_INDEX_TYPE must be auto or one of {', '.join(INDEX_KINDS)}, got {FAISS_INDEX_TYPE!r}")
+
+
+def min_train_points(kind: str) -> int:
+    """Vectors needed before an index of ``kind`` can be trained (k-means wants ~39 points per centroid)."""
+    if kind == "ivf_pq":
+        return 39 * 2 ** FAISS_PQ_BITS
+    if kind == "ivf_flat":
+        return 39
+    return 0
+
+
+def target_kind(ntotal: int) -> str:
+    if FAISS_INDEX_TYPE != "auto":
+        # A pinned trained type still starts flat until there is enough data to train it
+        return FAISS_INDEX_TYPE if ntotal >= min_train_points(FAISS_INDEX_TYPE) else "flat"
+    if ntotal < FAISS_FLAT_MAX:
+        return "flat"
+    if ntotal < FAISS_IVF_PQ_MIN:
+        return FAISS_MEDIUM_INDEX
+    return "ivf_pq"
+
+
+def index_kind(index) -> str:
+    import faiss
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def supports_remove(index) -> bool:
+    # HNSW cannot remove at all, and IVF keeps the original ids after remove_ids
+    # instead of compacting them the way the LangChain id mapping expects
+    return index_kind(index) == "flat"
+
+
+def configure(index):
+    """Apply the search-time tunables (nprobe / efSearch) to a built or loaded index."""
+    kind = index_kind(index)
+    if kind == "hnsw":
+        index.hnsw.efSearch = FAISS_EF_SEARCH
+    elif kind in ("ivf_flat", "ivf_pq"):
+        index.nprobe = FAISS_NPROBE
+    return index
+
+
+def _nlist(ntotal: int) -> int:
+    # Rule of thumb: ~4*sqrt(n) lists, each with enough points to train on
+    return max(1, min(int(4 * math.sqrt(ntotal)), ntotal // 39 or 1))
+
+
+def _pq_m(dim: int) -> int:
+    # PQ needs the number of sub-quantizers to divide the dimension
+    m = min(FAISS_PQ_M, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(vectors: np.ndarray, kind: str):
+    """Build and fill an L2 index of ``kind`` (training it first when needed)."""
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ntotal, dim = vectors.shape
+
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M)
+    elif kind in ("ivf_flat", "ivf_pq"):
+        quantizer = faiss.IndexFlatL2(dim)
+        nlist = _nlist(ntotal)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(dim), FAISS_PQ_BITS)
+        sample = vectors
+        if ntotal > FAISS_TRAIN_SAMPLE:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(ntotal, FAISS_TRAIN_SAMPLE, replace=False)]
+        index.train(sample)
+        # Keep ids addressable so vectors can be reconstructed for later rebuilds
+        index.make_direct_map()
+    else:
+        raise ValueError(f"Unknown FAISS index type: {kind}")
+
+    if ntotal:
+        index.add(vectors)
+    return configure(index)
+
+
+def reconstruct_all(index) -> np.ndarray:
+    """Return every stored vector in id order (approximate for IVF-PQ)."""
+    import faiss
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if index_kind(index) in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def maybe_upgrade(index):
+    """Rebuild ``index`` as a more scalable type once the corpus has crossed a size threshold."""
+    kind = target_kind(index.ntotal)
+    current = index_kind(index)
+    if kind == current or _TIER[kind] < _TIER[current]:
+        return index
+    return build_index(reconstruct_all(index), kind)
+
+
+def read_index(path: str):
+    """Read an index file, memory-mapping it when enabled so workers share the page cache."""
+    import faiss
+    if FAISS_MMAP:
+        try:
+            return configure(faiss.read_index(path, faiss.IO_FLAG_MMAP))
+        except RuntimeError:
+            # Not every index type can be mapped by every faiss build
+            pass
+    return configure(faiss.read_index(path))
+
+
+def recall_report(vectors: np.ndarray, queries: np.ndarray, k: int = 10, kinds=INDEX_KINDS):
+    """Compare each index type against exact search: recall@k and mean query latency."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    exact = build_index(vectors, "flat")
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for kind in kinds:
+        started = time.perf_counter()
+        index = build_index(vectors, kind)
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, found = index.search(queries, k)
+        search_seconds = time.perf_counter() - started
+
+        hits = sum(len(set(found[i]) & set(truth[i])) for i in range(len(queries)))
+        rows.append({
+            "kind": kind,
+            "recall_at_k": hits / float(len(queries) * k),
+            "ms_per_query": 1000.0 * search_seconds / len(queries),
+            "build_seconds": build_seconds,
+            "bytes_per_vector": _serialized_size(index) / max(1, index.ntotal),
+        })
+    return rows
+
+
+def _serialized_size(index) -> int:
+    import faiss
+    return faiss.serialize_index(index).nbytes
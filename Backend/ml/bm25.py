@@ -0,0 +1,92 @@
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Inverted index written next to each index generation, one row per FAISS
+# vector id (the same rows as the chunk store):
+#   bm25.json              row count, average length and the sorted vocabulary
+#   bm25.offsets.npy       int64 start of each term's postings
+#   bm25.rows.npy          int32 posting rows
+#   bm25.freqs.npy         int32 term frequency per posting
+#   bm25.lengths.npy       int32 token count per row
+LEXICAL_FILE = "bm25.json"
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Keeps section numbers ("3.2.1"), hyphenated names and acronyms as single terms
+_TOKEN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+
+def tokenize(text: str):
+    return _TOKEN.findall(text.lower())
+
+
+def lexical_exists(directory):
+    return os.path.exists(os.path.join(directory, LEXICAL_FILE))
+
+
+def write_lexical(directory, texts):
+    path = lambda name: os.path.join(directory, name)  # noqa: E731
+    postings = defaultdict(list)
+    lengths = np.zeros(len(texts), dtype=np.int32)
+    for row, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[row] = sum(counts.values())
+        for term, freq in counts.items():
+            postings[term].append((row, freq))
+
+    vocabulary = sorted(postings)
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    for i, term in enumerate(vocabulary):
+        offsets[i + 1] = offsets[i] + len(postings[term])
+    rows = np.fromiter((row for term in vocabulary for row, _ in postings[term]), dtype=np.int32, count=offsets[-1])
+    freqs = np.fromiter((freq for term in vocabulary for _, freq in postings[term]), dtype=np.int32, count=offsets[-1])
+
+    np.save(path("bm25.offsets.npy"), offsets)
+    np.save(path("bm25.rows.npy"), rows)
+    np.save(path("bm25.freqs.npy"), freqs)
+    np.save(path("bm25.lengths.npy"), lengths)
+    with open(path(LEXICAL_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "count": len(texts),
+            "average_length": float(lengths.mean()) if len(texts) else 0.0,
+            "vocabulary": vocabulary,
+        }, f)
+
+
+class LexicalIndex:
+    """Memory-mapped BM25 index over the rows of one index generation."""
+
+    def __init__(self, directory):
+        path = lambda name: os.path.join(directory, name)  # noqa: E731
+        with open(path(LEXICAL_FILE), encoding="utf-8") as f:
+            header = json.load(f)
+        self.count = header["count"]
+        self.average_length = header["average_length"] or 1.0
+        self.terms = {term: i for i, term in enumerate(header["vocabulary"])}
+        self.offsets = np.load(path("bm25.offsets.npy"), mmap_mode="r")
+        self.rows = np.load(path("bm25.rows.npy"), mmap_mode="r")
+        self.freqs = np.load(path("bm25.freqs.npy"), mmap_mode="r")
+        self.lengths = np.load(path("bm25.lengths.npy"), mmap_mode="r")
+
+    def search(self, query: str, k: int, mask=None):
+        """Rows of the ``k`` best BM25 matches for ``query``, optionally limited to ``mask``."""
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            start, end = int(self.offsets[t]), int(self.offsets[t + 1])
+            rows = self.rows[start:end]
+            freqs = self.freqs[start:end].astype(np.float32)
+            idf = math.log(1 + (self.count - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = freqs + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / self.average_length)
+            scores[rows] += idf * freqs * (BM25_K1 + 1) / norm
+        if mask is not None:
+            scores[~mask] = 0
+        hits = np.flatnonzero(scores > 0)
+        return hits[np.argsort(-scores[hits], kind="stable")[:k]].tolist()
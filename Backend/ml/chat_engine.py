@@ -1,75 +1,167 @@
 from langchain_core.messages import HumanMessage
-from langchain_mistralai.chat_models import ChatMistralAI
-from langchain.chains import ConversationalRetrievalChain
-from ml.vectorstore import load_vectorstore, create_vectorstore
-from ml.loader import load_pdf_chunks
+from database.document import update_document
+from ml.index_registry import get_vectorstore, register_vectorstore
+from ml.index_manager import add_document, remove_document, index_exists
+from ml.loader import iter_pdf, pdf_cache_key
+from ml.documents import store_upload
+from ml.chat_sessions import get_session
+from ml.retrieval import retrieve
+from ml import llm
+from utils.concurrency import run_in_stage
+import logging
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-api_key = os.getenv("MISTRAL_API_KEY")
-chat_memory = []
-
-llm = ChatMistralAI(
-    model="mistral-large-latest",
-    temperature=0,
-    max_retries=2,
-    api_key=api_key
-)
-chat_upload_dir = "chat_uploads"
 chat_vectorstore_dir = "chat_vectorstore"
 
+# Mirrors the prompts ConversationalRetrievalChain used before the pipeline was made streamable
+CONDENSE_PROMPT = """Given the following conversation and a follow up question, rephrase the follow up question to be a standalone question, in its original language.
 
+Chat History:
+{chat_history}
+Follow Up Input: {question}
+Standalone question:"""
 
-def upload_and_index_pdf_for_chat(file) -> str:
-    os.makedirs(chat_upload_dir, exist_ok=True)
-    os.makedirs(chat_vectorstore_dir, exist_ok=True)
+QA_PROMPT = """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
 
-    file_path = os.path.join(chat_upload_dir, file.filename)
+{context}
 
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
+Question: {question}
+Helpful Answer:"""
 
-    chunks = load_pdf_chunks(file_path)
-    create_vectorstore(chunks, index_path=chat_vectorstore_dir)
 
-    return file_path
 
+def user_index_path(user_id: str) -> str:
+    # Chat state is per signed-in user; there is no shared anonymous index
+    return os.path.join(chat_vectorstore_dir, user_id)
 
-def chat_with_ai(query: str) -> str:
-    try:
 
-        vectorstore_file = os.path.join(chat_vectorstore_dir, "index.faiss")
-        use_vectorstore = os.path.exists(vectorstore_file)
+def _current_vectorstore(index_path):
+    return get_vectorstore(index_path) if index_exists(index_path) else None
+
+
+def _index_document(index_path, document_id, pdf_path, file_hash):
+    """Parse and index in one pass; returns the pages extracted (empty if already indexed)."""
+    pages = []
+    chunks = iter_pdf(pdf_path, file_hash=file_hash, pages=pages)
+    vectorstore = add_document(index_path, document_id, chunks, current=_current_vectorstore(index_path))
+    register_vectorstore(index_path, vectorstore)
+    return pages
+
 
-        if use_vectorstore:
-            vectorstore = load_vectorstore(chat_vectorstore_dir)
+def _unindex_document(index_path, document_id):
+    if not index_exists(index_path):
+        return False
+    vectorstore = remove_document(index_path, document_id, current=get_vectorstore(index_path))
+    if vectorstore is None:
+        return False
+    register_vectorstore(index_path, vectorstore)
+    return True
 
 
-            relevant_docs = vectorstore.similarity_search(query, k=1)
+async def upload_and_index_pdf_for_chat(file, user_id: str) -> str:
+    """Add an uploaded PDF to the user's study index and return its document id."""
+    # Parsed by the indexing step below rather than up front, so embedding starts with the first pages
+    document = await store_upload(file, owner_id=user_id, parse=False)
+    document_id = str(document["_id"])
 
- 
-            if not relevant_docs or len(relevant_docs) == 0:
-                raise ValueError("No relevant PDF chunks found. Using general chat.")
+    # Appends only this document's chunks; earlier uploads stay searchable
+    index_path = user_index_path(user_id)
+    # Extraction and embedding run with the other document work on the parse pool,
+    # keeping the small index pool free for the loads and searches chat turns wait on
+    pages = await run_in_stage("parse", _index_document, index_path, document_id, document["path"], document["sha256"])
+    fields = {"artifacts.chat_index": index_path}
+    if pages:
+        fields["page_count"] = len(pages)
+        fields["artifacts.chunks"] = pdf_cache_key(document["path"], file_hash=document["sha256"])
+    await update_document(document_id, fields)
 
+    llm.forget_answers(user_id)
+    return document_id
 
-            chain = ConversationalRetrievalChain.from_llm(
-                llm=llm,
-                retriever=vectorstore.as_retriever(search_type="similarity", k=4),
-                return_source_documents=False,
-            )
-            response = chain.invoke({"question": query, "chat_history": chat_memory})
-            answer = response["answer"]
-            chat_memory.append((query, answer))
-            return answer
 
+async def remove_pdf_from_chat(document_id: str, user_id: str) -> bool:
+    removed = await run_in_stage("parse", _unindex_document, user_index_path(user_id), document_id)
+    llm.forget_answers(user_id)
+    return removed
 
-        raise FileNotFoundError("No vectorstore found")
 
-    except Exception as e:
+def _open_session(user_id: str, document_id: str):
+    session = get_session(user_id, document_id)
+    session.index_path = user_index_path(user_id)
+    return session
 
-        response = llm.invoke([HumanMessage(content=query)])
-        answer = str(response.content) if hasattr(response, "content") else str(response)
-        chat_memory.append((query, answer))
-        return answer
\ No newline at end of file
+
+async def _condense_question(query: str, history) -> str:
+    if not history:
+        return query
+    chat_history = "\n".join(f"Human: {q}\nAssistant: {a}" for q, a in history)
+    prompt = CONDENSE_PROMPT.format(chat_history=chat_history, question=query)
+    return (await llm.generate([HumanMessage(content=prompt)])).strip()
+
+
+async def _session_vectorstore(session):
+    index_path = session.index_path
+    if index_path is None or not index_exists(index_path):
+        return None
+    try:
+        vectorstore = await run_in_stage("index", get_vectorstore, index_path)
+    except FileNotFoundError as e:
+        # Removed between the existence check and the load: nothing to search
+        logger.warning("Chat index at %s disappeared while loading: %s", index_path, e)
+        return None
+    return vectorstore if vectorstore.index.ntotal > 0 else None
+
+
+async def _answer_messages(question: str, vectorstore, document_id: str = None):
+    if vectorstore is None:
+        # No usable PDF index: answer as a general chat
+        return [HumanMessage(content=question)]
+    docs = await retrieve(vectorstore, question, document_id=document_id)
+    context = "\n\n".join(doc.page_content for doc in docs)
+    return [HumanMessage(content=QA_PROMPT.format(context=context, question=question))]
+
+
+async def _prepare_turn(query: str, session):
+    """Return (question, vectorstore, cached answer) for a turn.
+
+    The standalone question is checked against the semantic cache before any
+    retrieval, so a hit skips both the search and the model call.
+    """
+    vectorstore = await _session_vectorstore(session)
+    question = query
+    if vectorstore is not None:
+        question = await _condense_question(query, list(session.history))
+    answer = await llm.lookup_similar_answer((session.user_id, session.document_id), question)
+    return question, vectorstore, answer
+
+
+async def chat_with_ai(query: str, user_id: str, document_id: str = None) -> str:
+    session = _open_session(user_id, document_id)
+    question, vectorstore, answer = await _prepare_turn(query, session)
+
+    if answer is None:
+        answer = await llm.generate(await _answer_messages(question, vectorstore, session.document_id))
+        await llm.remember_answer((session.user_id, session.document_id), question, answer)
+
+    session.add_turn(query, answer)
+    return answer
+
+
+async def stream_chat(query: str, user_id: str, document_id: str = None):
+    """Yield the answer token by token; the turn is added to the session once it completes."""
+    session = _open_session(user_id, document_id)
+    question, vectorstore, answer = await _prepare_turn(query, session)
+
+    if answer is not None:
+        yield answer
+    else:
+        parts = []
+        async for token in llm.stream(await _answer_messages(question, vectorstore, session.document_id)):
+            parts.append(token)
+            yield token
+        answer = "".join(parts)
+        await llm.remember_answer((session.user_id, session.document_id), question, answer)
+
+    session.add_turn(query, answer)
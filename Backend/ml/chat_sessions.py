@@ -0,0 +1,57 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+CHAT_HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "6"))
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "3600"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+
+DOCUMENT_ID_PATTERN = re.compile(r"^[0-9a-f]{24}$")
+
+
+class ChatSession:
+    def __init__(self, user_id: str, document_id: str = None):
+        self.user_id = user_id
+        self.document_id = document_id
+        # Only the last few turns are replayed to the model, so the prompt size
+        # of a turn does not grow with the length of the conversation
+        self.history = deque(maxlen=CHAT_HISTORY_WINDOW)
+        self.last_used = time.monotonic()
+        # The user's study index, chat_vectorstore/<user id>, set when the session is opened
+        self.index_path = None
+
+    def add_turn(self, question: str, answer: str):
+        self.history.append((question, answer))
+
+
+# (user_id, document_id) -> ChatSession, least recently used first
+_sessions = OrderedDict()
+_lock = threading.Lock()
+
+
+def _evict(now):
+    while _sessions:
+        key, session = next(iter(_sessions.items()))
+        if len(_sessions) <= CHAT_MAX_SESSIONS and now - session.last_used < CHAT_SESSION_TTL_SECONDS:
+            break
+        del _sessions[key]
+
+
+def get_session(user_id: str, document_id: str = None) -> ChatSession:
+    """Return the chat session for a user and document.
+
+    Without a document the session covers every document in the user's study index.
+    """
+    now = time.monotonic()
+    with _lock:
+        key = (user_id, document_id)
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = ChatSession(user_id, document_id)
+        session.last_used = now
+        _sessions.move_to_end(key)
+        _evict(now)
+        return session
+
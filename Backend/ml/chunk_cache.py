@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+from langchain_core.documents import Document
+
+CHUNK_CACHE_DIR = os.getenv("CHUNK_CACHE_DIR", "chunk_cache")
+CHUNK_CACHE_MAX_BYTES = int(os.getenv("CHUNK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_FORMAT_VERSION = 1
+
+_evict_lock = threading.Lock()
+
+
+def cache_key(file_hash: str, chunk_size: int, chunk_overlap: int, extractor: str = "pypdf") -> str:
+    return f"{file_hash}-{extractor}-{chunk_size}-{chunk_overlap}-v{CACHE_FORMAT_VERSION}"
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(CHUNK_CACHE_DIR, f"{key}.json.z")
+
+
+def _encode(pages, chunks) -> bytes:
+    # Chunks are substrings of their page, so store them as (page, start, length)
+    # spans instead of repeating the text and the splitter overlap on disk
+    encoded_chunks = []
+    cursors = [0] * len(pages)
+    for chunk in chunks:
+        i = _find_page(chunk, pages)
+        if i is None:
+            encoded_chunks.append({"text": chunk.page_content, "metadata": chunk.metadata})
+            continue
+        text = pages[i].page_content
+        start = text.find(chunk.page_content, cursors[i])
+        if start < 0:
+            start = text.find(chunk.page_content)
+        if start < 0:
+            encoded_chunks.append({"text": chunk.page_content, "metadata": chunk.metadata})
+            continue
+        cursors[i] = start + 1
+        encoded_chunks.append({"span": [i, start, len(chunk.page_content)]})
+
+    payload = {
+        "pages": [{"text": page.page_content, "metadata": page.metadata} for page in pages],
+        "chunks": encoded_chunks,
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def _find_page(chunk, pages):
+    page_no = chunk.metadata.get("page")
+    if page_no is not None:
+        for i, page in enumerate(pages):
+            if page.metadata.get("page") == page_no and chunk.page_content in page.page_content:
+                return i
+    for i, page in enumerate(pages):
+        if chunk.page_content in page.page_content:
+            return i
+    return None
+
+
+def _decode(data: bytes, source: str):
+    payload = json.loads(zlib.decompress(data).decode("utf-8"))
+    pages = []
+    for page in payload["pages"]:
+        metadata = dict(page["metadata"], source=source)
+        pages.append(Document(page_content=page["text"], metadata=metadata))
+
+    chunks = []
+    for chunk in payload["chunks"]:
+        if "span" in chunk:
+            i, start, length = chunk["span"]
+            page = pages[i]
+            chunks.append(Document(
+                page_content=page.page_content[start:start + length],
+                metadata=dict(page.metadata, start_index=start),
+            ))
+        else:
+            chunks.append(Document(page_content=chunk["text"], metadata=dict(chunk["metadata"], source=source)))
+    return pages, chunks
+
+
+def get(key: str, source: str):
+    path = _entry_path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # mark as recently used for eviction
+    except FileNotFoundError:
+        return None
+    try:
+        return _decode(data, source)
+    except (ValueError, KeyError, zlib.error):
+        os.remove(path)
+        return None
+
+
+def put(key: str, pages, chunks):
+    os.makedirs(CHUNK_CACHE_DIR, exist_ok=True)
+    data = _encode(pages, chunks)
+    fd, tmp_path = tempfile.mkstemp(dir=CHUNK_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, _entry_path(key))
+    evict()
+
+
+def evict(max_bytes: int = CHUNK_CACHE_MAX_BYTES):
+    with _evict_lock:
+        entries = []
+        for name in os.listdir(CHUNK_CACHE_DIR):
+            if not name.endswith(".json.z"):
+                continue
+            try:
+                stat = os.stat(os.path.join(CHUNK_CACHE_DIR, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(CHUNK_CACHE_DIR, name))
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,251 @@
+import json
+import mmap
+import os
+from collections.abc import Mapping
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+# On-disk layout, one row per FAISS vector id (row number = vector id):
+#   chunks.json             row count and the string tables for the coded columns
+#   chunks.id.bin/.off      UTF-8 docstore ids
+#   chunks.order.npy        int64 rows sorted by id, for id -> row lookups
+#   chunks.text.bin         UTF-8 chunk texts in one blob, with int64 row
+#   chunks.text.off.npy     offsets into it
+#   chunks.extra.bin/.off   JSON of any metadata keys without their own column
+#   chunks.page.npy         int32 page number (-1 when absent)
+#   chunks.document.npy     int32 code into the "documents" table
+#   chunks.source.npy       int32 code into the "sources" table
+# Everything is memory-mapped, so loading a store reads only the header; an id
+# or chunk is only decoded when a search returns it.
+STORE_FILE = "chunks.json"
+STORE_VERSION = 2
+# Version 1 kept the ids in a newline-separated chunks.ids read into memory
+_LEGACY_IDS_VERSION = 1
+COLUMN_KEYS = ("page", "document_id", "source")
+
+
+def store_exists(directory):
+    return os.path.exists(os.path.join(directory, STORE_FILE))
+
+
+def _write_blob(prefix, parts):
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    with open(f"{prefix}.bin", "wb") as f:
+        for i, part in enumerate(parts):
+            f.write(part)
+            offsets[i + 1] = offsets[i] + len(part)
+    np.save(f"{prefix}.off.npy", offsets)
+
+
+class _Blob:
+    def __init__(self, prefix):
+        self.offsets = np.load(f"{prefix}.off.npy", mmap_mode="r")
+        with open(f"{prefix}.bin", "rb") as f:
+            # mmap refuses empty files
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __getitem__(self, row):
+        return self.data[int(self.offsets[row]):int(self.offsets[row + 1])]
+
+
+class _Columns:
+    """Read-only, memory-mapped rows of a committed chunk store."""
+
+    def __init__(self, directory):
+        path = lambda name: os.path.join(directory, name)  # noqa: E731
+        with open(path(STORE_FILE), encoding="utf-8") as f:
+            header = json.load(f)
+        version = header.get("version")
+        if version not in (STORE_VERSION, _LEGACY_IDS_VERSION):
+            raise ValueError(f"Unsupported chunk store version in {directory}")
+        self.count = header["count"]
+        self.documents = header["documents"]
+        self.sources = header["sources"]
+        if version == _LEGACY_IDS_VERSION:
+            # Rewritten in the current layout by the next commit to this index
+            with open(path("chunks.ids"), encoding="utf-8") as f:
+                ids = f.read().split("\n") if self.count else []
+            self.ids = [chunk_id.encode("utf-8") for chunk_id in ids]
+            self.order = np.asarray(sorted(range(self.count), key=self.ids.__getitem__), dtype=np.int64)
+        else:
+            self.ids = _Blob(path("chunks.id"))
+            self.order = np.load(path("chunks.order.npy"), mmap_mode="r")
+        self.text = _Blob(path("chunks.text"))
+        self.extra = _Blob(path("chunks.extra"))
+        self.page = np.load(path("chunks.page.npy"), mmap_mode="r")
+        self.document = np.load(path("chunks.document.npy"), mmap_mode="r")
+        self.source = np.load(path("chunks.source.npy"), mmap_mode="r")
+
+    def id_at(self, row):
+        return self.ids[row].decode("utf-8")
+
+    def row_of(self, chunk_id):
+        """Row holding ``chunk_id``, or None; a binary search over the sorted order."""
+        key = chunk_id.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.ids[int(self.order[middle])] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.ids[int(self.order[low])] == key:
+            return int(self.order[low])
+        return None
+
+    def document_at(self, row):
+        extra = self.extra[row]
+        metadata = json.loads(extra) if extra else {}
+        if self.page[row] >= 0:
+            metadata["page"] = int(self.page[row])
+        if self.document[row] >= 0:
+            metadata["document_id"] = self.documents[self.document[row]]
+        if self.source[row] >= 0:
+            metadata["source"] = self.sources[self.source[row]]
+        return Document(page_content=self.text[row].decode("utf-8"), metadata=metadata)
+
+
+class RowIds(Mapping):
+    """Read-only FAISS vector id -> docstore id mapping, read from the mapped id column on demand."""
+
+    def __init__(self, columns):
+        self._columns = columns
+
+    def __getitem__(self, row):
+        if not 0 <= row < self._columns.count:
+            raise KeyError(row)
+        return self._columns.id_at(row)
+
+    def __iter__(self):
+        return iter(range(self._columns.count))
+
+    def __len__(self):
+        return self._columns.count
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """LangChain docstore over a committed chunk store plus in-memory changes since.
+
+    Added documents live in a dict and deletions of committed rows are
+    recorded as a set, so copying a store for a write never touches the
+    mapped files.
+    """
+
+    def __init__(self, directory=None, documents=None):
+        self._columns = _Columns(directory) if directory else None
+        self._added = dict(documents or {})
+        self._deleted = set()
+
+    def row_ids(self):
+        """The committed ids as an ``index_to_docstore_id`` mapping."""
+        return RowIds(self._columns) if self._columns else {}
+
+    def _row(self, chunk_id):
+        return self._columns.row_of(chunk_id) if self._columns else None
+
+    def copy(self):
+        other = ChunkStore.__new__(ChunkStore)
+        other._columns = self._columns
+        other._added = dict(self._added)
+        other._deleted = set(self._deleted)
+        return other
+
+    def document_mask(self, document_id):
+        """Boolean mask over committed rows belonging to ``document_id``."""
+        if self._columns is None:
+            return None
+        if document_id not in self._columns.documents:
+            return np.zeros(self._columns.count, dtype=bool)
+        return np.asarray(self._columns.document) == self._columns.documents.index(document_id)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self._added or (chunk_id not in self._deleted and self._row(chunk_id) is not None)
+
+    def __len__(self):
+        return len(self._added) + (self._columns.count if self._columns else 0) - len(self._deleted)
+
+    def search(self, search):
+        if search in self._added:
+            return self._added[search]
+        row = None if search in self._deleted else self._row(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self._columns.document_at(row)
+
+    def add(self, texts):
+        overlapping = [chunk_id for chunk_id in texts if chunk_id in self]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for chunk_id, document in texts.items():
+            self._deleted.discard(chunk_id)
+            self._added[chunk_id] = document
+
+    def delete(self, ids):
+        missing = [chunk_id for chunk_id in ids if chunk_id not in self]
+        if missing:
+            raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+        for chunk_id in ids:
+            if self._added.pop(chunk_id, None) is None:
+                self._deleted.add(chunk_id)
+
+
+def copy_docstore(docstore):
+    """A ChunkStore with the same contents as ``docstore`` (a ChunkStore or an InMemoryDocstore)."""
+    if isinstance(docstore, ChunkStore):
+        return docstore.copy()
+    return ChunkStore(documents=docstore._dict)
+
+
+def write_store(directory, docstore, ids):
+    """Write the documents for ``ids`` (in FAISS vector id order) as a chunk store in ``directory``.
+
+    Returns the chunk texts in row order.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = lambda name: os.path.join(directory, name)  # noqa: E731
+    tables = {"documents": {}, "sources": {}}
+
+    def code(table, value):
+        if value is None:
+            return -1
+        return tables[table].setdefault(value, len(tables[table]))
+
+    contents, texts, extras = [], [], []
+    pages = np.full(len(ids), -1, dtype=np.int32)
+    documents = np.full(len(ids), -1, dtype=np.int32)
+    sources = np.full(len(ids), -1, dtype=np.int32)
+    for row, chunk_id in enumerate(ids):
+        document = docstore.search(chunk_id)
+        if not isinstance(document, Document):
+            raise KeyError(f"Chunk {chunk_id} missing from docstore")
+        metadata = document.metadata
+        contents.append(document.page_content)
+        texts.append(document.page_content.encode("utf-8"))
+        extra = {key: value for key, value in metadata.items() if key not in COLUMN_KEYS}
+        extras.append(json.dumps(extra).encode("utf-8") if extra else b"")
+        if isinstance(metadata.get("page"), int):
+            pages[row] = metadata["page"]
+        elif "page" in metadata:
+            extras[-1] = json.dumps(dict(extra, page=metadata["page"])).encode("utf-8")
+        documents[row] = code("documents", metadata.get("document_id"))
+        sources[row] = code("sources", metadata.get("source"))
+
+    _write_blob(path("chunks.text"), texts)
+    _write_blob(path("chunks.extra"), extras)
+    np.save(path("chunks.page.npy"), pages)
+    np.save(path("chunks.document.npy"), documents)
+    np.save(path("chunks.source.npy"), sources)
+    encoded_ids = [chunk_id.encode("utf-8") for chunk_id in ids]
+    _write_blob(path("chunks.id"), encoded_ids)
+    np.save(path("chunks.order.npy"), np.asarray(sorted(range(len(ids)), key=encoded_ids.__getitem__), dtype=np.int64))
+    # The header goes last: its presence marks a complete store
+    with open(path(STORE_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": STORE_VERSION,
+            "count": len(ids),
+            "documents": list(tables["documents"]),
+            "sources": list(tables["sources"]),
+        }, f)
+    return contents
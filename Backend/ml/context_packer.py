@@ -0,0 +1,114 @@
+import math
+import os
+
+import numpy as np
+
+from ml.embedder import get_embedder
+from ml.tokens import count_tokens
+
+# Prompt tokens of document content sent with one generation call
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# 1.0 picks purely representative chunks, lower values favour coverage
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.6"))
+# Requests for more items than this are split across sections generated in parallel
+ITEMS_PER_CALL = int(os.getenv("ITEMS_PER_CALL", "10"))
+CONTEXT_MAX_SECTIONS = int(os.getenv("CONTEXT_MAX_SECTIONS", "4"))
+
+
+def _overlap(previous, current) -> int:
+    """Characters at the start of ``current`` the splitter repeated from ``previous``.
+
+    Only consecutive chunks of the same page overlap; the length comes from
+    the splitter's start offsets, never from matching text.
+    """
+    start, previous_start = current.metadata.get("start_index"), previous.metadata.get("start_index")
+    if start is None or previous_start is None:
+        return 0
+    if current.metadata.get("page") != previous.metadata.get("page"):
+        return 0
+    size = previous_start + len(previous.page_content) - start
+    if size <= 0 or size > len(current.page_content):
+        return 0
+    return size if previous.page_content.endswith(current.page_content[:size]) else 0
+
+
+def dedupe_chunks(chunks):
+    """Chunk texts with the splitter's overlap with the previous chunk removed, and exact repeats dropped."""
+    texts, seen, previous = [], set(), None
+    for chunk in chunks:
+        text = chunk.page_content
+        if previous is not None:
+            text = text[_overlap(previous, chunk):]
+        previous = chunk
+        text = text.strip()
+        if text and text not in seen:
+            seen.add(text)
+            texts.append(text)
+    return texts
+
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def select_diverse(texts, vectors, budget_tokens, mmr_lambda=CONTEXT_MMR_LAMBDA):
+    """Maximal marginal relevance under a token budget, returned in document order.
+
+    Relevance is similarity to the centroid of ``vectors`` (how representative
+    a chunk is of the whole section); the penalty is similarity to chunks
+    already picked.
+    """
+    if not texts:
+        return []
+    vectors = _unit_rows(vectors)
+    centroid = _unit_rows(vectors.mean(axis=0, keepdims=True))[0]
+    relevance = vectors @ centroid
+    tokens = [count_tokens(text) for text in texts]
+
+    selected, remaining, used = [], set(range(len(texts))), 0
+    redundancy = np.full(len(texts), -1.0, dtype=np.float32)
+    while remaining:
+        candidates = [i for i in remaining if used + tokens[i] <= budget_tokens]
+        if not candidates:
+            break
+        scores = mmr_lambda * relevance[candidates] - (1 - mmr_lambda) * np.maximum(redundancy[candidates], 0)
+        best = candidates[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.discard(best)
+        used += tokens[best]
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return [texts[i] for i in sorted(selected)]
+
+
+def _split_counts(total, parts):
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+async def pack_sections(chunks, num_items, budget_tokens=CONTEXT_TOKEN_BUDGET):
+    """Return [(context, items)] generation tasks covering the document.
+
+    Small requests get one task whose context is the best ``budget_tokens`` of
+    the whole document; large ones are split into contiguous sections, each
+    packed to its own budget and asked for its share of ``num_items``.
+    """
+    texts = dedupe_chunks(chunks)
+    if not texts:
+        return [("", num_items)]
+
+    sections = max(1, min(math.ceil(num_items / ITEMS_PER_CALL), CONTEXT_MAX_SECTIONS, len(texts)))
+    bounds = np.linspace(0, len(texts), sections + 1).astype(int)
+    parts = [texts[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    # Only sections over budget need embeddings for MMR; the rest are sent whole
+    over = [i for i, part in enumerate(parts) if sum(count_tokens(text) for text in part) > budget_tokens]
+    if over:
+        vectors = await get_embedder().aembed_documents([text for i in over for text in parts[i]])
+        start = 0
+        for i in over:
+            stop = start + len(parts[i])
+            parts[i] = select_diverse(parts[i], vectors[start:stop], budget_tokens)
+            start = stop
+
+    return [("\n\n".join(part), items) for part, items in zip(parts, _split_counts(num_items, sections))]
@@ -1,9 +1,23 @@
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import bson
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
 from database.__init__ import history_collection
+from utils.metrics import timed
 
-from datetime import datetime
+HISTORY_PAGE_SIZE = 100
+# What list views need; bodies (summary, quiz, flashcards, answers) are fetched by id
+LIST_FIELDS = ("file_name", "type", "timestamp", "size")
+BODY_FIELDS = {"summarizer": "summary", "quiz": "quiz", "flashcards": "flashcards", "chat": "answer"}
+_EPOCH = datetime(1970, 1, 1)
 
+async def _insert_history(entry: dict):
+    # Stored at write time so list views can show sizes without reading the bodies
+    entry["size"] = len(bson.encode(entry))
+    await history_collection.insert_one(entry)
+
+@timed("mongo", operation="save_summary_history")
 async def save_summary_history(user_id: str, file_name: str, summary: str):
     entry = {
         "user_id": user_id,
@@ -12,13 +26,57 @@ async def save_summary_history(user_id: str, file_name: str, summary: str):
         "timestamp": datetime.utcnow(),
         "type": "summarizer"
     }
-    await history_collection.insert_one(entry)
+    await _insert_history(entry)
+
+def encode_cursor(item) -> str:
+    millis = (item["timestamp"] - _EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}-{item['_id']}"
 
-async def get_user_history(user_id: str):
-    cursor = history_collection.find({"user_id": user_id}).sort("timestamp", -1)
-    return await cursor.to_list(length=100)
+def decode_cursor(cursor: str):
+    """Return (timestamp, ObjectId) from a cursor; raises ValueError if it is malformed."""
+    try:
+        millis, item_id = cursor.split("-", 1)
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(item_id)
+    except (ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
+@timed("mongo", operation="list_history")
+async def list_history(user_id: str, item_type: str = None, limit: int = HISTORY_PAGE_SIZE, cursor: str = None):
+    """One page of a user's history, newest first: (items, next cursor or None).
 
+    Items carry the list fields and the stored size in bytes, not the bodies.
+    Entries written before sizes were recorded have no ``size``.
+    """
+    match = {"user_id": user_id}
+    if item_type is not None:
+        match["type"] = item_type
+    if cursor is not None:
+        timestamp, item_id = decode_cursor(cursor)
+        # Keyset pagination: strictly after the last item of the previous page
+        match["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": item_id}},
+        ]
+    query = history_collection.find(match, {field: 1 for field in LIST_FIELDS})
+    items = await query.sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+@timed("mongo", operation="get_history_item")
+async def get_history_item(user_id: str, item_type: str, item_id: str):
+    """The stored body of one history item, or None if it is missing or not the user's."""
+    try:
+        object_id = ObjectId(item_id)
+    except InvalidId:
+        return None
+    field = BODY_FIELDS[item_type]
+    doc = await history_collection.find_one(
+        {"_id": object_id, "user_id": user_id, "type": item_type}, {field: 1}
+    )
+    return doc.get(field) if doc else None
+
+
+@timed("mongo", operation="save_quiz_history")
 async def save_quiz_history(user_id: str, file_name: str, quiz: str):
     entry = {
         "user_id": user_id,
@@ -27,10 +85,23 @@ async def save_quiz_history(user_id: str, file_name: str, quiz: str):
         "timestamp": datetime.utcnow(),
         "type": "quiz"
     }
-    await history_collection.insert_one(entry)
+    await _insert_history(entry)
 
 
 
+@timed("mongo", operation="save_chat_history")
+async def save_chat_history(user_id: str, question: str, answer: str):
+    entry = {
+        "user_id": user_id,
+        "question": question,
+        "answer": answer,
+        "timestamp": datetime.utcnow(),
+        "type": "chat"
+    }
+    await _insert_history(entry)
+
+
+@timed("mongo", operation="save_flashcard_history")
 async def save_flashcard_history(user_id: str, file_name: str, flashcards: list):
     doc = {
         "user_id": user_id,
@@ -39,7 +110,4 @@ async def save_flashcard_history(user_id: str, file_name: str, flashcards: list)
         "flashcards": flashcards,
         "timestamp": datetime.utcnow()
     }
-    await history_collection.insert_one(doc)
-
-async def get_flashcard_history(user_id: str):
-    return await history_collection.find({"user_id": user_id, "type": "flashcards"}).to_list(length=100)
\ No newline at end of file
+    await _insert_history(doc)
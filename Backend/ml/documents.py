@@ -0,0 +1,40 @@
+import os
+
+from database.document import register_document, set_artifact
+from ml.loader import load_pdf
+from utils.concurrency import run_in_stage
+from utils.file_utils import save_upload_stream
+
+document_store_dir = "uploads"
+
+
+def _move_into_store(tmp_path: str, sha256: str, file_name: str) -> str:
+    extension = os.path.splitext(file_name)[1].lower() or ".pdf"
+    path = os.path.join(document_store_dir, f"{sha256}{extension}")
+    # Identical bytes are stored once, whoever uploads them
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+
+async def store_upload(file, owner_id=None, parse=True):
+    """Store an uploaded PDF by content hash and register it for ``owner_id``.
+
+    With ``parse=False`` the caller parses the file itself (streaming it into
+    an index) and records the page count and chunk cache key afterwards.
+    """
+    tmp_path, sha256, size = await save_upload_stream(file, document_store_dir)
+    path = _move_into_store(tmp_path, sha256, file.filename)
+    if not parse:
+        return await register_document(owner_id, file.filename, sha256, size, None, path)
+
+    # Parse once at upload time: this fills the chunk cache the generators read from
+    pages, _, chunks_key = await run_in_stage("parse", load_pdf, path, file_hash=sha256)
+
+    document = await register_document(owner_id, file.filename, sha256, size, len(pages), path)
+    if document["artifacts"].get("chunks") != chunks_key:
+        await set_artifact(document["_id"], "chunks", chunks_key)
+        document["artifacts"]["chunks"] = chunks_key
+    return document
@@ -1,4 +1,174 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from queue import Queue, Empty
 
-def get_embedder():
-    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+from langchain_core.embeddings import Embeddings
+
+from utils.metrics import record_cache, register_gauge, span
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split())
+
+
+class EmbeddingService(Embeddings):
+    """Shared sentence-transformers encoder.
+
+    Concurrent encode calls are queued and coalesced by a single worker thread
+    into one forward pass of up to ``batch_size`` texts, waiting at most
+    ``max_wait_ms`` for a batch to fill; larger calls are fed to it one batch
+    at a time. Query embeddings are kept in an LRU
+    cache keyed by whitespace-normalized text.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, batch_size=EMBED_BATCH_SIZE,
+                 max_wait_ms=EMBED_MAX_WAIT_MS, cache_size=EMBED_CACHE_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.cache_size = cache_size
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while count < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except Empty:
+                    break
+                batch.append(item)
+                count += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                with span("embed"):
+                    vectors = self.model.encode(
+                        texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False
+                    ).tolist()
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            start = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[start:start + len(item_texts)])
+                start += len(item_texts)
+
+    def _submit(self, texts):
+        texts = list(texts)
+        if len(texts) <= self.batch_size:
+            future = Future()
+            self._queue.put((texts, future))
+            return future
+
+        # Large requests are queued one batch_size slice at a time, so query
+        # encodes submitted meanwhile run between slices instead of after all of them
+        result = Future()
+        slices = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        vectors = []
+
+        def submit_next(done=None):
+            if done is not None:
+                if done.exception() is not None:
+                    result.set_exception(done.exception())
+                    return
+                vectors.extend(done.result())
+            if len(vectors) == len(texts):
+                result.set_result(vectors)
+                return
+            part = Future()
+            part.add_done_callback(submit_next)
+            self._queue.put((slices[len(vectors) // self.batch_size], part))
+
+        submit_next()
+        return result
+
+    def encode(self, texts):
+        if not texts:
+            return []
+        return self._submit(texts).result()
+
+    async def aencode(self, texts):
+        if not texts:
+            return []
+        # Wait on the batcher without tying up an executor thread
+        return await asyncio.wrap_future(self._submit(texts))
+
+    def embed_documents(self, texts):
+        return self.encode([text.replace("\n", " ") for text in texts])
+
+    async def aembed_documents(self, texts):
+        return await self.aencode([text.replace("\n", " ") for text in texts])
+
+    def _cached_query(self, key):
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+        record_cache("query_embedding", vector is not None)
+        return vector
+
+    def _cache_query(self, key, vector):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def embed_query(self, text):
+        key = normalize_query(text)
+        vector = self._cached_query(key)
+        if vector is None:
+            vector = self.encode([key])[0]
+            self._cache_query(key, vector)
+        return vector
+
+    async def aembed_query(self, text):
+        key = normalize_query(text)
+        vector = self._cached_query(key)
+        if vector is None:
+            vector = (await self.aencode([key]))[0]
+            self._cache_query(key, vector)
+        return vector
+
+
+register_gauge("ai_tutor_embedding_queue_depth", "Encode requests waiting for the batching worker.",
+               lambda: _embedder._queue.qsize() if _embedder is not None else 0)
+
+
+def get_embedder() -> EmbeddingService:
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = EmbeddingService()
+    return _embedder
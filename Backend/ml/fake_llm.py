@@ -0,0 +1,65 @@
+import asyncio
+import os
+import random
+import re
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# Local stand-in for the provider (LLM_PROVIDER=fake) for load and failure
+# testing: every call sleeps, then fails at FAKE_LLM_ERROR_RATE with the HTTP
+# error the Mistral client would raise, or returns canned text.
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "100"))
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "5"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_ERROR_STATUS = int(os.getenv("FAKE_LLM_ERROR_STATUS", "429"))
+FAKE_LLM_RESPONSE = os.getenv("FAKE_LLM_RESPONSE", "This is a placeholder answer from the fake LLM provider.")
+FAKE_LLM_JSON_RESPONSE = os.getenv("FAKE_LLM_JSON_RESPONSE", '{"items": []}')
+
+
+class FakeChatModel:
+    """The subset of the chat model interface ml/llm.py uses: ``bind``, ``ainvoke`` and ``astream``."""
+
+    def __init__(self, latency_ms=FAKE_LLM_LATENCY_MS, jitter_ms=FAKE_LLM_JITTER_MS, token_ms=FAKE_LLM_TOKEN_MS,
+                 error_rate=FAKE_LLM_ERROR_RATE, error_status=FAKE_LLM_ERROR_STATUS, json_mode=False, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_ms = token_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.json_mode = json_mode
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+
+    def bind(self, response_format=None, **kwargs):
+        bound = FakeChatModel(self.latency_ms, self.jitter_ms, self.token_ms, self.error_rate, self.error_status,
+                              json_mode=response_format is not None)
+        bound.rng = self.rng
+        return bound
+
+    def _error(self):
+        import httpx
+
+        request = httpx.Request("POST", "http://fake-llm.local/v1/chat/completions")
+        headers = {"retry-after": "1"} if self.error_status == 429 else None
+        response = httpx.Response(self.error_status, request=request, headers=headers)
+        return httpx.HTTPStatusError(f"Fake provider returned {self.error_status}", request=request, response=response)
+
+    async def _respond(self) -> str:
+        self.calls += 1
+        latency = self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(0.0, latency) / 1000)
+        if self.rng.random() < self.error_rate:
+            self.failures += 1
+            raise self._error()
+        return FAKE_LLM_JSON_RESPONSE if self.json_mode else FAKE_LLM_RESPONSE
+
+    async def ainvoke(self, messages, **kwargs):
+        return AIMessage(content=await self._respond())
+
+    async def astream(self, messages, **kwargs):
+        text = await self._respond()
+        for piece in re.findall(r"\S+\s*", text):
+            await asyncio.sleep(self.token_ms / 1000)
+            yield AIMessageChunk(content=piece)
@@ -1,52 +1,46 @@
-
 from ml.loader import load_pdf_chunks
-from langchain_mistralai import ChatMistralAI
-from langchain_core.messages import SystemMessage, HumanMessage
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-API_KEY = os.getenv("MISTRAL_API_KEY")
+from ml.context_packer import pack_sections
+from ml.structured_output import ItemSpec, generate_items, steering
+from utils.concurrency import run_in_stage
 
-llm = ChatMistralAI(
-    model="mistral-large-latest",
-    temperature=0,
-    max_retries=2,
-    api_key=API_KEY
-)
+class FlashcardSpec(ItemSpec):
+    system_prompt = "You are a flashcard generator. You reply with JSON only."
 
-def generate_flashcards(pdf_path: str, num_cards: int = 5) -> list:
-    chunks = load_pdf_chunks(pdf_path)
-    full_text = " ".join([chunk.page_content for chunk in chunks])
+    def prompt(self, content, count, avoid, part):
+        return f"""
+You are a flashcard generator. Read the following content and generate {count} flashcards.
 
-    prompt = f"""
-You are a flashcard generator. Read the following content and generate {num_cards} flashcards in this format:
-Q: <question>
-A: <answer>
-
-Only output the flashcards in this format.
+Reply with a JSON object of this shape:
+{{"items": [{{"question": "...", "answer": "..."}}]}}
+{steering(avoid, part)}
 
 Content:
-{full_text}
+{content}
 """
 
-    messages = [
-        SystemMessage(content="You are a flashcard generator."),
-        HumanMessage(content=prompt),
+    def validate(self, raw):
+        if not isinstance(raw, dict):
+            return None
+        question, answer = raw.get("question"), raw.get("answer")
+        if not isinstance(question, str) or not isinstance(answer, str) or not question.strip() or not answer.strip():
+            return None
+        return {"question": question.strip(), "answer": answer.strip()}
+
+    def key(self, item):
+        return item["question"]
+
+async def generate_flashcards(pdf_path: str, num_cards: int = 5) -> list:
+    chunks = await run_in_stage("parse", load_pdf_chunks, pdf_path)
+    # Token-budgeted, de-duplicated context per section; batches run concurrently
+    sections = await pack_sections(chunks, num_cards)
+    cards = await generate_items(FlashcardSpec(), sections)
+
+    return [
+        {
+            "id": idx + 1,
+            "front": card["question"],
+            "back": card["answer"],
+            "category": "Generated"
+        }
+        for idx, card in enumerate(cards)
     ]
-
-    response = llm.invoke(messages)
-    raw_cards = response.content.strip().split("\n\n")
-
-    flashcards = []
-    for idx, card in enumerate(raw_cards):
-        lines = card.strip().split("\n")
-        if len(lines) >= 2 and lines[0].startswith("Q:") and lines[1].startswith("A:"):
-            flashcards.append({
-                "id": idx + 1,
-                "front": lines[0][2:].strip(),
-                "back": lines[1][2:].strip(),
-                "category": "Generated"
-            })
-
-    return flashcards
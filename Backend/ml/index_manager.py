@@ -0,0 +1,260 @@
+import contextlib
+import fcntl
+import json
+import os
+import pickle
+import shutil
+
+from ml import ann
+from ml.bm25 import LexicalIndex, lexical_exists, write_lexical
+from ml.chunk_store import ChunkStore, copy_docstore, store_exists, write_store
+from ml.embedder import EMBED_BATCH_SIZE, get_embedder
+from utils.metrics import span, timed
+
+# An index directory holds numbered generations (gen-000001/index.faiss plus
+# the chunk store and BM25 files) and a MANIFEST.json naming the committed one.
+# A new generation is written completely before the manifest is atomically
+# replaced, so a crash mid-save leaves the previous generation in effect.
+# The previous generation is kept until the next commit so readers that
+# resolved the manifest just before a commit can still open its files.
+MANIFEST_FILE = "MANIFEST.json"
+# Writers in every process (uvicorn workers, job workers) serialize on this file
+LOCK_FILE = ".write.lock"
+
+
+@contextlib.contextmanager
+def _write_lock(index_path):
+    os.makedirs(index_path, exist_ok=True)
+    # flock conflicts between separate open()s even within one process, so this covers threads too
+    with open(os.path.join(index_path, LOCK_FILE), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_manifest(index_path):
+    try:
+        with open(os.path.join(index_path, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def generation_dir(index_path, manifest=None):
+    """Directory holding the committed index files, or None when nothing is committed."""
+    manifest = manifest if manifest is not None else read_manifest(index_path)
+    if manifest is not None:
+        return os.path.join(index_path, manifest["dir"])
+    # Indexes written before generations existed keep their files at the top level
+    if os.path.exists(os.path.join(index_path, "index.faiss")):
+        return index_path
+    return None
+
+
+def index_exists(index_path):
+    return generation_dir(index_path) is not None
+
+
+@timed("index_load")
+def load_index(index_path):
+    from langchain.vectorstores import FAISS
+    gen_dir = generation_dir(index_path)
+    if gen_dir is None:
+        raise FileNotFoundError(f"No index committed at {index_path}")
+    index = ann.read_index(os.path.join(gen_dir, "index.faiss"))
+    if store_exists(gen_dir):
+        docstore = ChunkStore(gen_dir)
+        # Both read the mapped columns on demand; nothing per chunk is built here
+        index_to_docstore_id = docstore.row_ids()
+    else:
+        # Written by FAISS.save_local before the chunk store existed; the next
+        # commit rewrites it in the new format
+        with open(os.path.join(gen_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    vectorstore = FAISS(
+        embedding_function=get_embedder(),
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+    # Row-aligned with the FAISS ids; absent for generations written before it existed
+    vectorstore.lexical_index = LexicalIndex(gen_dir) if lexical_exists(gen_dir) else None
+    # Lets writers tell whether a vectorstore they were handed is still the committed one
+    vectorstore.generation_dir = gen_dir
+    return vectorstore
+
+
+def save_files(directory, vectorstore):
+    """Write the FAISS index, its chunk store and its BM25 index into ``directory``."""
+    import faiss
+    os.makedirs(directory, exist_ok=True)
+    faiss.write_index(vectorstore.index, os.path.join(directory, "index.faiss"))
+    ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+    write_lexical(directory, write_store(directory, vectorstore.docstore, ids))
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _commit(index_path, vectorstore, manifest):
+    os.makedirs(index_path, exist_ok=True)
+    generation = (manifest or {}).get("generation", 0) + 1
+    gen_name = f"gen-{generation:06d}"
+    gen_dir = os.path.join(index_path, gen_name)
+
+    save_files(gen_dir, vectorstore)
+    for name in os.listdir(gen_dir):
+        with open(os.path.join(gen_dir, name), "rb") as f:
+            os.fsync(f.fileno())
+
+    new_manifest = {
+        "generation": generation,
+        "dir": gen_name,
+        "documents": (manifest or {}).get("documents", {}),
+    }
+    tmp_path = os.path.join(index_path, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(new_manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(index_path, MANIFEST_FILE))
+    _fsync_dir(index_path)
+
+    # Keep the generation just replaced for in-flight readers; anything older
+    # (or left by an interrupted save) is no longer referenced
+    keep = {gen_name, (manifest or {}).get("dir")}
+    for name in os.listdir(index_path):
+        if name.startswith("gen-") and name not in keep:
+            shutil.rmtree(os.path.join(index_path, name), ignore_errors=True)
+    return new_manifest
+
+
+def _is_committed(index_path, vectorstore):
+    return getattr(vectorstore, "generation_dir", None) == generation_dir(index_path)
+
+
+def _copy(vectorstore):
+    import faiss
+    from langchain.vectorstores import FAISS
+
+    # Writers work on a copy so concurrent searches on the live object are unaffected
+    return FAISS(
+        embedding_function=vectorstore.embedding_function,
+        index=ann.configure(faiss.clone_index(vectorstore.index)),
+        docstore=copy_docstore(vectorstore.docstore),
+        index_to_docstore_id=dict(vectorstore.index_to_docstore_id),
+    )
+
+
+def _rebuild_without(vectorstore, removed_ids):
+    from langchain.vectorstores import FAISS
+    # For approximate index types: rebuild from the surviving vectors
+    vectors = ann.reconstruct_all(vectorstore.index)
+    keep = [i for i in range(vectorstore.index.ntotal) if vectorstore.index_to_docstore_id[i] not in removed_ids]
+    kept_ids = [vectorstore.index_to_docstore_id[i] for i in keep]
+    docstore = copy_docstore(vectorstore.docstore)
+    docstore.delete([chunk_id for chunk_id in removed_ids if chunk_id in docstore])
+    kind = ann.index_kind(vectorstore.index)
+    if len(keep) < ann.min_train_points(kind):
+        # Too few vectors left to retrain; maybe_upgrade moves it back once the corpus grows
+        kind = "flat"
+    return FAISS(
+        embedding_function=vectorstore.embedding_function,
+        index=ann.build_index(vectors[keep], kind),
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(kept_ids)),
+    )
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def add_document(index_path, document_key, chunks, current=None):
+    """Append a document's chunks to the index, embedding only chunks not already stored.
+
+    ``chunks`` may be a lazy iterable (e.g. ``loader.iter_pdf``): chunks are
+    embedded in batches as they arrive, so embedding overlaps extraction, and
+    nothing is consumed when the document is already indexed. ``current`` is
+    the live vectorstore for ``index_path`` if the caller has one; otherwise
+    the committed generation is loaded. Returns the new vectorstore, or the
+    unchanged one if the document was already indexed.
+    """
+    from langchain.vectorstores import FAISS
+
+    with _write_lock(index_path):
+        manifest = read_manifest(index_path) or {}
+        documents = manifest.setdefault("documents", {})
+
+        # Another process may have committed since ``current`` was loaded
+        if current is not None and not _is_committed(index_path, current):
+            current = None
+        if current is None and index_exists(index_path):
+            current = load_index(index_path)
+        if current is not None and document_key in documents:
+            return current
+
+        known = set(current.index_to_docstore_id.values()) if current is not None else set()
+        ids, text_embeddings, metadatas, new_ids = [], [], [], []
+        for batch in _batches(enumerate(chunks), EMBED_BATCH_SIZE):
+            batch_ids = [f"{document_key}-{i}" for i, _ in batch]
+            ids.extend(batch_ids)
+            new = [(chunk_id, chunk) for chunk_id, (_, chunk) in zip(batch_ids, batch) if chunk_id not in known]
+            if not new:
+                continue
+            texts = [chunk.page_content for _, chunk in new]
+            text_embeddings.extend(zip(texts, get_embedder().embed_documents(texts)))
+            metadatas.extend(dict(chunk.metadata, document_id=document_key) for _, chunk in new)
+            new_ids.extend(chunk_id for chunk_id, _ in new)
+        if not new_ids:
+            return current
+
+        if current is None:
+            vectorstore = FAISS.from_embeddings(text_embeddings, get_embedder(), metadatas=metadatas, ids=new_ids)
+        else:
+            vectorstore = _copy(current)
+            vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=new_ids)
+        # Switch to an approximate index once the corpus is big enough to need one
+        vectorstore.index = ann.maybe_upgrade(vectorstore.index)
+
+        documents[document_key] = ids
+        with span("index_commit"):
+            _commit(index_path, vectorstore, manifest)
+        # Reopen the committed files: mapped, and with the lexical index built at commit
+        return load_index(index_path)
+
+
+def remove_document(index_path, document_key, current=None):
+    """Delete a document's vectors; returns the new vectorstore, or None if the document is not indexed."""
+    with _write_lock(index_path):
+        manifest = read_manifest(index_path)
+        if manifest is None or document_key not in manifest["documents"]:
+            return None
+        if current is None or not _is_committed(index_path, current):
+            current = load_index(index_path)
+
+        ids = set(manifest["documents"].pop(document_key))
+        present = [chunk_id for chunk_id in current.index_to_docstore_id.values() if chunk_id in ids]
+        if not ann.supports_remove(current.index):
+            vectorstore = _rebuild_without(current, ids)
+        else:
+            vectorstore = _copy(current)
+            if present:
+                vectorstore.delete(present)
+        with span("index_commit"):
+            _commit(index_path, vectorstore, manifest)
+        return load_index(index_path)
@@ -0,0 +1,96 @@
+import os
+import threading
+from collections import OrderedDict
+
+from ml.index_manager import generation_dir, load_index
+from utils.metrics import record_cache
+
+INDEX_CACHE_MAX_BYTES = int(os.getenv("INDEX_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Legacy generations have index.pkl, newer ones the chunk store and BM25 files
+INDEX_FILES = (
+    "index.faiss", "index.pkl", "chunks.json", "chunks.ids", "chunks.id.bin", "chunks.id.off.npy", "chunks.order.npy",
+    "chunks.text.bin", "chunks.text.off.npy",
+    "chunks.extra.bin", "chunks.extra.off.npy", "chunks.page.npy", "chunks.document.npy", "chunks.source.npy",
+    "bm25.json", "bm25.offsets.npy", "bm25.rows.npy", "bm25.freqs.npy", "bm25.lengths.npy",
+)
+
+# abs index path -> (version, size_bytes, vectorstore), least recently used first
+_indexes = OrderedDict()
+_lock = threading.Lock()
+_load_locks = {}
+
+
+def _stat_index(index_path):
+    # A commit can retire the generation between reading the manifest and
+    # statting its files; the manifest read on the retry names the new one
+    for _ in range(3):
+        gen_dir = generation_dir(index_path)
+        if gen_dir is None:
+            break
+        stats = []
+        for name in INDEX_FILES:
+            try:
+                stats.append(os.stat(os.path.join(gen_dir, name)))
+            except FileNotFoundError:
+                pass
+        if stats:
+            return (gen_dir, max(s.st_mtime_ns for s in stats)), sum(s.st_size for s in stats)
+    raise FileNotFoundError(f"No index committed at {index_path}")
+
+
+def _evict():
+    total = sum(entry[1] for entry in _indexes.values())
+    while len(_indexes) > 1 and total > INDEX_CACHE_MAX_BYTES:
+        _, (_, size, _) = _indexes.popitem(last=False)
+        total -= size
+
+
+def _lookup(key, version):
+    entry = _indexes.get(key)
+    if entry is not None and entry[0] == version:
+        _indexes.move_to_end(key)
+        return entry[2]
+    return None
+
+
+def get_vectorstore(index_path):
+    """Return the loaded index at ``index_path``, reloading only when its files changed on disk."""
+    key = os.path.abspath(index_path)
+    version, size = _stat_index(index_path)
+
+    with _lock:
+        vectorstore = _lookup(key, version)
+        record_cache("index", vectorstore is not None)
+        if vectorstore is not None:
+            return vectorstore
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        # Another request may have loaded it while we waited
+        with _lock:
+            vectorstore = _lookup(key, version)
+            if vectorstore is not None:
+                return vectorstore
+
+        vectorstore = load_index(index_path)
+        with _lock:
+            _indexes[key] = (version, size, vectorstore)
+            _indexes.move_to_end(key)
+            _evict()
+        return vectorstore
+
+
+def register_vectorstore(index_path, vectorstore):
+    """Store a freshly saved index so the next query does not load it back from disk."""
+    key = os.path.abspath(index_path)
+    version, size = _stat_index(index_path)
+    with _lock:
+        _indexes[key] = (version, size, vectorstore)
+        _indexes.move_to_end(key)
+        _evict()
+
+
+def invalidate(index_path):
+    with _lock:
+        _indexes.pop(os.path.abspath(index_path), None)
@@ -0,0 +1,299 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+from ml.summarizer import summarize_text
+from ml.quiz_generator import generate_quiz_questions, format_question
+from ml.flashcard_generator import generate_flashcards
+from ml.db import save_summary_history, save_quiz_history, save_flashcard_history
+from utils.metrics import register_gauge
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# A running job whose lease is not renewed (worker crashed or restarted) is picked up again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# Claims per job; a job whose worker keeps dying (e.g. a PDF that crashes the parser) fails after this many
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Client-requested priorities are clamped to 0..JOB_MAX_PRIORITY so no caller can jump the whole queue
+JOB_MAX_PRIORITY = int(os.getenv("JOB_MAX_PRIORITY", "2"))
+
+JOB_KINDS = ("summarize", "quiz", "flashcards")
+TERMINAL_STATUSES = ("done", "failed")
+
+_workers = []
+_wakeup = None
+_finished = {}
+
+
+@contextlib.contextmanager
+def _connect():
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def queue_depths():
+    depths = {"queued": 0, "running": 0}
+    with _connect() as conn:
+        query = "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+        for status, count in conn.execute(query):
+            depths[status] = count
+    return {(("status", status),): count for status, count in depths.items()}
+
+
+register_gauge("ai_tutor_job_queue_depth", "Background jobs by status.", queue_depths)
+
+
+def init_db():
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                params TEXT NOT NULL,
+                dedup_key TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                lease_until REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "attempts" not in columns:
+            # Databases created before attempts were counted
+            conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)")
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job.pop("dedup_key")
+    job.pop("lease_until")
+    return job
+
+
+def dedup_key(kind: str, user_id: str, params: dict) -> str:
+    # Identity is the file contents plus generation parameters, not where the file lives
+    params = {k: v for k, v in params.items() if k not in ("document_id", "file_path", "file_name")}
+    raw = json.dumps({"kind": kind, "user_id": user_id, "params": params}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _submit(kind, user_id, params, priority):
+    key = dedup_key(kind, user_id, params)
+    now = time.time()
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = conn.execute(
+                "SELECT id FROM jobs WHERE dedup_key = ? AND status != 'failed' ORDER BY created_at DESC LIMIT 1",
+                (key,),
+            ).fetchone()
+            if existing:
+                conn.execute("COMMIT")
+                return existing["id"], False
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, user_id, params, dedup_key, priority, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, user_id, json.dumps(params), key, priority, now, now),
+            )
+            conn.execute("COMMIT")
+            return job_id, True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _claim():
+    now = time.time()
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that have used up their attempts are not retried again
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ?"
+                " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (f"Worker stopped during each of {JOB_MAX_ATTEMPTS} attempts", now, now, JOB_MAX_ATTEMPTS),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                " ORDER BY priority DESC, created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ?"
+                " WHERE id = ?",
+                (now + JOB_LEASE_SECONDS, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            job = _row_to_job(row)
+            job["attempts"] += 1
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _renew_lease(job_id):
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+            (now + JOB_LEASE_SECONDS, now, job_id),
+        )
+
+
+def _finish(job_id, status, result=None, error=None):
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+
+
+def _requeue(job_id):
+    # A clean shutdown is not the job's fault, so the attempt is given back
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), lease_until = NULL, updated_at = ?"
+            " WHERE id = ? AND status = 'running'",
+            (time.time(), job_id),
+        )
+
+
+def _get(job_id):
+    with _connect() as conn:
+        return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+async def submit_job(kind: str, user_id: str, params: dict, priority: int = 0):
+    """Queue a job, or return the existing one for the same user, kind, file contents and parameters.
+
+    ``params`` must carry ``file_hash`` alongside ``file_path``.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    priority = min(max(int(priority), 0), JOB_MAX_PRIORITY)
+    job_id, created = await asyncio.to_thread(_submit, kind, user_id, params, priority)
+    if created and _wakeup is not None:
+        _wakeup.set()
+    return job_id, created
+
+
+async def get_job(job_id: str):
+    return await asyncio.to_thread(_get, job_id)
+
+
+async def wait_for_job(job_id: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await get_job(job_id)
+        remaining = deadline - time.monotonic()
+        if job is None or job["status"] in TERMINAL_STATUSES or remaining <= 0:
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                _finished.pop(job_id, None)
+            return job
+        # Jobs finished in this process signal right away; others are seen on the next poll
+        event = _finished.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=min(remaining, JOB_POLL_SECONDS))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _run_job(job):
+    params = job["params"]
+    user_id = job["user_id"]
+
+    if job["kind"] == "summarize":
+        summary = await summarize_text(params["file_path"], mode=params.get("mode", "auto"))
+        await save_summary_history(user_id, params["file_name"], summary)
+        return {"summary": summary}
+
+    if job["kind"] == "quiz":
+        questions = await generate_quiz_questions(params["file_path"], num_questions=params.get("num_questions", 5))
+        quiz = [format_question(q) for q in questions]
+        await save_quiz_history(user_id, params["file_name"], quiz)
+        return {"quiz": quiz, "questions": questions}
+
+    if job["kind"] == "flashcards":
+        flashcards = await generate_flashcards(params["file_path"], num_cards=params.get("num_questions", 5))
+        await save_flashcard_history(user_id, params["file_name"], flashcards)
+        return {"flashcards": flashcards}
+
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+async def _keep_lease(job_id):
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        await asyncio.to_thread(_renew_lease, job_id)
+
+
+async def _worker():
+    while True:
+        job = await asyncio.to_thread(_claim)
+        if job is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        lease = asyncio.create_task(_keep_lease(job["id"]))
+        try:
+            result = await _run_job(job)
+            await asyncio.to_thread(_finish, job["id"], "done", result=result)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back to the queue for the next worker
+            _requeue(job["id"])
+            raise
+        except Exception as e:
+            await asyncio.to_thread(_finish, job["id"], "failed", error=str(e))
+        finally:
+            lease.cancel()
+
+        event = _finished.pop(job["id"], None)
+        if event is not None:
+            event.set()
+
+
+async def start_workers(num_workers: int = JOB_WORKERS):
+    global _wakeup
+    await asyncio.to_thread(init_db)
+    _wakeup = asyncio.Event()
+    for _ in range(num_workers):
+        _workers.append(asyncio.create_task(_worker()))
+
+
+async def stop_workers():
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+
+from langchain_core.messages import BaseMessage
+from dotenv import load_dotenv
+
+from ml.embedder import get_embedder
+from ml.llm_cache import ExactCache, SemanticCache, prompt_key
+from ml.tokens import count_tokens
+from utils.concurrency import track
+from utils.metrics import Counter, record_cache, record_tokens, span
+from utils.rate_limit import llm_slot
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+API_KEY = os.getenv("MISTRAL_API_KEY")
+# "mistral", or "fake" for the latency/error-injecting stand-in in ml/fake_llm.py
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "mistral")
+MODEL_NAME = os.getenv("LLM_MODEL", "mistral-large-latest")
+TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_SEMANTIC_CACHE_ENABLED = os.getenv("LLM_SEMANTIC_CACHE_ENABLED", "0") == "1"
+# Retries live here rather than in the SDK so they happen inside the admission
+# slot and back off with jitter instead of in lockstep
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Constrains the model to emit a single JSON object
+JSON_FORMAT = {"type": "json_object"}
+
+# One client (and its HTTP connection pool) per process, built on first use so
+# that importing the routes does not pull in the Mistral SDK
+_clients = None
+_clients_lock = threading.Lock()
+
+exact_cache = ExactCache()
+semantic_cache = SemanticCache()
+
+llm_retries = Counter("ai_tutor_llm_retries_total", "LLM calls retried after a transient provider error.")
+
+
+def get_client(json_mode: bool = False):
+    global _clients
+    if _clients is None:
+        with _clients_lock:
+            if _clients is None:
+                if LLM_PROVIDER == "fake":
+                    from ml.fake_llm import FakeChatModel
+
+                    llm = FakeChatModel()
+                else:
+                    from langchain_mistralai import ChatMistralAI
+
+                    llm = ChatMistralAI(
+                        model=MODEL_NAME,
+                        temperature=TEMPERATURE,
+                        max_retries=0,
+                        api_key=API_KEY
+                    )
+                _clients = (llm, llm.bind(response_format=JSON_FORMAT))
+    return _clients[1 if json_mode else 0]
+
+
+def _serialize(messages):
+    serialized = []
+    for message in messages:
+        if isinstance(message, BaseMessage):
+            serialized.append([message.type, message.content])
+        else:
+            role, content = message
+            serialized.append([role, content])
+    return serialized
+
+
+def _retryable(error) -> bool:
+    import httpx
+
+    if isinstance(error, httpx.TransportError):
+        return True
+    return getattr(getattr(error, "response", None), "status_code", None) in RETRY_STATUSES
+
+
+def _backoff_seconds(attempt: int, error) -> float:
+    # Full jitter spreads out callers that failed together; a provider Retry-After is a floor
+    delay = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(delay, min(float(headers.get("retry-after", 0)), LLM_RETRY_MAX_SECONDS))
+    except ValueError:
+        return delay
+
+
+async def _before_retry(attempt: int, error):
+    if attempt >= LLM_MAX_RETRIES or not _retryable(error):
+        raise error
+    llm_retries.inc()
+    await asyncio.sleep(_backoff_seconds(attempt, error))
+
+
+def _cache_key(messages, json_mode=False):
+    # Keep stand-in responses out of the real provider's cache entries
+    model = MODEL_NAME if LLM_PROVIDER == "mistral" else f"{LLM_PROVIDER}:{MODEL_NAME}"
+    return prompt_key(model, TEMPERATURE, _serialize(messages), JSON_FORMAT if json_mode else None)
+
+
+async def _cache_get(key):
+    if not LLM_CACHE_ENABLED:
+        return None
+    cached = await asyncio.to_thread(exact_cache.get, key)
+    record_cache("llm_exact", cached is not None)
+    return cached
+
+
+async def _cache_put(key, value):
+    if LLM_CACHE_ENABLED:
+        await asyncio.to_thread(exact_cache.put, key, value)
+
+
+def _record_usage(messages, completion: str, usage):
+    # Mistral reports usage; estimate with tiktoken when a response does not carry it
+    try:
+        if usage:
+            record_tokens(usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+        else:
+            prompt = "\n".join(str(content) for _, content in _serialize(messages))
+            record_tokens(count_tokens(prompt), count_tokens(completion))
+    except Exception:
+        # Bookkeeping must never fail the completion it describes
+        logger.exception("Could not record LLM token usage")
+
+
+async def generate(messages, json_mode: bool = False) -> str:
+    """Return the completion text for ``messages``, served from the exact-match cache when possible."""
+    key = _cache_key(messages, json_mode)
+    cached = await _cache_get(key)
+    if cached is not None:
+        return cached
+
+    with track("llm"), span("llm", call="generate"):
+        async with llm_slot():
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    response = await get_client(json_mode).ainvoke(messages)
+                    break
+                except Exception as e:
+                    await _before_retry(attempt, e)
+    content = str(response.content) if hasattr(response, "content") else str(response)
+    _record_usage(messages, content, getattr(response, "usage_metadata", None))
+    await _cache_put(key, content)
+    return content
+
+
+async def stream(messages, json_mode: bool = False):
+    """Yield completion tokens; a cached completion is yielded as a single piece."""
+    key = _cache_key(messages, json_mode)
+    cached = await _cache_get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    usage = None
+    with track("llm"), span("llm", call="stream"):
+        async with llm_slot():
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    async for chunk in get_client(json_mode).astream(messages):
+                        usage = getattr(chunk, "usage_metadata", None) or usage
+                        if chunk.content:
+                            parts.append(chunk.content)
+                            yield chunk.content
+                    break
+                except Exception as e:
+                    if parts:
+                        raise  # tokens already reached the caller; a retry would repeat them
+                    await _before_retry(attempt, e)
+    _record_usage(messages, "".join(parts), usage)
+    await _cache_put(key, "".join(parts))
+
+
+async def _question_vector(question: str):
+    return await get_embedder().aembed_query(question)
+
+
+async def lookup_similar_answer(scope, question: str):
+    if not LLM_SEMANTIC_CACHE_ENABLED:
+        return None
+    answer = semantic_cache.get(scope, await _question_vector(question))
+    record_cache("llm_semantic", answer is not None)
+    return answer
+
+
+async def remember_answer(scope, question: str, answer: str):
+    if LLM_SEMANTIC_CACHE_ENABLED and answer:
+        semantic_cache.put(scope, question, await _question_vector(question), answer)
+
+
+def forget_answers(user_id: str):
+    """Drop a user's semantically cached answers, e.g. after their study index changed."""
+    semantic_cache.drop(lambda scope: scope[0] == user_id)
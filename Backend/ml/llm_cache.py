@@ -0,0 +1,135 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+LLM_SEMANTIC_CACHE_SIZE = int(os.getenv("LLM_SEMANTIC_CACHE_SIZE", "2000"))
+LLM_SEMANTIC_THRESHOLD = float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.95"))
+
+
+def prompt_key(model: str, temperature: float, messages, response_format=None) -> str:
+    request = {"model": model, "temperature": temperature, "messages": messages}
+    if response_format is not None:
+        request["response_format"] = response_format
+    raw = json.dumps(request, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ExactCache:
+    """Completion cache keyed by prompt hash, stored in SQLite and evicted least-recently-used by size."""
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            if not self._initialized:
+                with self._init_lock:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS completions ("
+                        " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS completions_lru ON completions (last_used)")
+                    self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            for old_key, old_size in conn.execute("SELECT key, size FROM completions ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM completions WHERE key = ?", (old_key,))
+                total -= old_size
+            conn.execute("COMMIT")
+
+
+class SemanticCache:
+    """In-memory cache of chat answers looked up by question embedding similarity.
+
+    Entries are scoped (per user and document) because the same question has
+    a different answer against a different PDF.
+    """
+
+    def __init__(self, max_entries=LLM_SEMANTIC_CACHE_SIZE, threshold=LLM_SEMANTIC_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()  # scope -> OrderedDict[question -> (unit vector, answer)]
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, scope, vector):
+        query = self._unit(vector)
+        with self._lock:
+            entries = self._entries.get(scope)
+            if not entries:
+                return None
+            questions = list(entries)
+            matrix = np.stack([entries[q][0] for q in questions])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._entries.move_to_end(scope)
+            entries.move_to_end(questions[best])
+            return entries[questions[best]][1]
+
+    def put(self, scope, question: str, vector, answer: str):
+        with self._lock:
+            entries = self._entries.setdefault(scope, OrderedDict())
+            if question not in entries:
+                self._count += 1
+            entries[question] = (self._unit(vector), answer)
+            entries.move_to_end(question)
+            self._entries.move_to_end(scope)
+            while self._count > self.max_entries:
+                oldest_scope, oldest = next(iter(self._entries.items()))
+                oldest.popitem(last=False)
+                self._count -= 1
+                if not oldest:
+                    del self._entries[oldest_scope]
+
+    def drop(self, predicate):
+        with self._lock:
+            for scope in [scope for scope in self._entries if predicate(scope)]:
+                self._count -= len(self._entries.pop(scope))
@@ -1,8 +1,55 @@
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-def load_pdf_chunks(pdf_path):
-    loader = PyPDFLoader(pdf_path)
-    documents = loader.load()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    return splitter.split_documents(documents)
+from ml import chunk_cache
+from ml.pdf_extract import PDF_BACKEND, iter_pages
+from utils.file_utils import file_sha256
+from utils.metrics import record_cache, span
+
+def iter_pdf_chunks(pdf_path, chunk_size=1000, chunk_overlap=200, pages=None):
+    """Yield chunks page by page as the PDF is extracted; extracted pages are appended to ``pages``."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    # start_index lets consumers tell the splitter overlap from text that merely looks alike
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    for page in iter_pages(pdf_path):
+        if pages is not None:
+            pages.append(page)
+        yield from splitter.split_documents([page])
+
+def pdf_cache_key(pdf_path, chunk_size=1000, chunk_overlap=200, file_hash=None):
+    return chunk_cache.cache_key(file_hash or file_sha256(pdf_path), chunk_size, chunk_overlap, PDF_BACKEND)
+
+def iter_pdf(pdf_path, chunk_size=1000, chunk_overlap=200, file_hash=None, pages=None):
+    """Yield a PDF's chunks as extraction produces them (or from the chunk cache), caching them at the end.
+
+    Extracted pages are appended to ``pages``. Lets indexing embed the first
+    chunks while later pages are still being extracted.
+    """
+    key = pdf_cache_key(pdf_path, chunk_size, chunk_overlap, file_hash)
+    pages = pages if pages is not None else []
+    cached = chunk_cache.get(key, source=pdf_path)
+    record_cache("chunks", cached is not None)
+    if cached is not None:
+        pages.extend(cached[0])
+        yield from cached[1]
+        return
+
+    chunks = []
+    for chunk in iter_pdf_chunks(pdf_path, chunk_size, chunk_overlap, pages=pages):
+        chunks.append(chunk)
+        yield chunk
+    chunk_cache.put(key, pages, chunks)
+
+def load_pdf(pdf_path, chunk_size=1000, chunk_overlap=200, file_hash=None):
+    """Return (pages, chunks, cache key) for a PDF, parsing it only on a cache miss."""
+    key = pdf_cache_key(pdf_path, chunk_size, chunk_overlap, file_hash)
+    cached = chunk_cache.get(key, source=pdf_path)
+    record_cache("chunks", cached is not None)
+    if cached is not None:
+        return cached[0], cached[1], key
+
+    documents = []
+    with span("parse"):
+        chunks = list(iter_pdf_chunks(pdf_path, chunk_size, chunk_overlap, pages=documents))
+    chunk_cache.put(key, documents, chunks)
+    return documents, chunks, key
+
+def load_pdf_chunks(pdf_path, chunk_size=1000, chunk_overlap=200):
+    return load_pdf(pdf_path, chunk_size, chunk_overlap)[1]
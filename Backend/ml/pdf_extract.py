@@ -0,0 +1,110 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from langchain_core.documents import Document
+
+# "pymupdf" (default) or "pypdf"
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pymupdf")
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages handed to a worker at a time; smaller files are extracted in-process
+PDF_EXTRACT_BATCH = int(os.getenv("PDF_EXTRACT_BATCH", "16"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: the server process has model and executor threads that fork would copy mid-flight
+                _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _pymupdf_pages(pdf_path, start, stop):
+    """Text of pages [start, stop), with None for pages PyMuPDF failed on."""
+    import fitz
+
+    texts = []
+    with fitz.open(pdf_path) as pdf:
+        for number in range(start, stop):
+            try:
+                texts.append(pdf.load_page(number).get_text())
+            except Exception:
+                texts.append(None)
+    return texts
+
+
+def _pymupdf_page_count(pdf_path):
+    import fitz
+
+    with fitz.open(pdf_path) as pdf:
+        return pdf.page_count
+
+
+class _PypdfPages:
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self._reader = None
+
+    def __call__(self, number):
+        if self._reader is None:
+            from pypdf import PdfReader
+            self._reader = PdfReader(self.pdf_path)
+        return self._reader.pages[number].extract_text() or ""
+
+
+def _page(pdf_path, number, text):
+    # Same metadata PyPDFLoader produced, so chunk and index code is backend-agnostic
+    return Document(page_content=text, metadata={"source": pdf_path, "page": number})
+
+
+def _iter_pypdf(pdf_path):
+    from pypdf import PdfReader
+
+    for number, page in enumerate(PdfReader(pdf_path).pages):
+        yield _page(pdf_path, number, page.extract_text() or "")
+
+
+def _iter_pymupdf(pdf_path, workers):
+    fallback = _PypdfPages(pdf_path)
+    try:
+        page_count = _pymupdf_page_count(pdf_path)
+    except Exception:
+        yield from _iter_pypdf(pdf_path)
+        return
+
+    ranges = [(start, min(start + PDF_EXTRACT_BATCH, page_count)) for start in range(0, page_count, PDF_EXTRACT_BATCH)]
+    if workers > 1 and len(ranges) > 1:
+        pool = _get_pool()
+        batches = (future.result() for future in [pool.submit(_pymupdf_pages, pdf_path, *r) for r in ranges])
+    else:
+        batches = (_pymupdf_pages(pdf_path, *r) for r in ranges)
+
+    # Batches come back in page order; callers can start on the first pages while the rest are extracted
+    for (start, _), texts in zip(ranges, batches):
+        for offset, text in enumerate(texts):
+            number = start + offset
+            yield _page(pdf_path, number, text if text is not None else fallback(number))
+
+
+def iter_pages(pdf_path, backend=None, workers=None):
+    """Yield one Document per page, in page order."""
+    backend = backend or PDF_BACKEND
+    if backend == "pypdf":
+        return _iter_pypdf(pdf_path)
+    if backend == "pymupdf":
+        return _iter_pymupdf(pdf_path, PDF_EXTRACT_WORKERS if workers is None else workers)
+    raise ValueError(f"Unknown PDF backend: {backend}")
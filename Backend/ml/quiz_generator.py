@@ -1,34 +1,55 @@
-
 from ml.loader import load_pdf_chunks
-from langchain_mistralai import ChatMistralAI
-from langchain_core.messages import SystemMessage, HumanMessage
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-API_KEY = os.getenv("MISTRAL_API_KEY")
-
-llm = ChatMistralAI(
-    model="mistral-large-latest",
-    temperature=0,
-    max_retries=2,
-    api_key=API_KEY
-)
-def generate_quiz_questions(pdf_path: str, num_questions: int = 5) -> list:
-    chunks = load_pdf_chunks(pdf_path)
-    full_text = " ".join([chunk.page_content for chunk in chunks])
-
-    prompt = f"""
-You are a quiz generator. Read the following content and generate {num_questions} multiple-choice questions with 4 options and indicate the correct answer.
+from ml.context_packer import pack_sections
+from ml.structured_output import ItemSpec, generate_items, steering
+from utils.concurrency import run_in_stage
+
+class QuizSpec(ItemSpec):
+    system_prompt = "You are a quiz-making assistant. You reply with JSON only."
+
+    def prompt(self, content, count, avoid, part):
+        return f"""
+You are a quiz generator. Read the following content and generate {count} multiple-choice questions with 4 options and indicate the correct answer.
+
+Reply with a JSON object of this shape:
+{{"items": [{{"question": "...", "options": ["...", "...", "...", "..."], "answer": "<the correct option, copied exactly>"}}]}}
+{steering(avoid, part)}
 
 Content:
-{full_text}
+{content}
 """
 
-    messages = [
-        SystemMessage(content="You are a quiz-making assistant."),
-        HumanMessage(content=prompt),
-    ]
+    def validate(self, raw):
+        if not isinstance(raw, dict):
+            return None
+        question, options, answer = raw.get("question"), raw.get("options"), raw.get("answer")
+        if not isinstance(question, str) or not question.strip():
+            return None
+        if not isinstance(options, list) or len(options) != 4 or not all(isinstance(o, str) and o.strip() for o in options):
+            return None
+        options = [option.strip() for option in options]
+        if len(set(options)) != 4 or not isinstance(answer, str):
+            return None
+        answer = answer.strip()
+        # Accept a bare letter as well as the option text
+        if answer.upper() in ("A", "B", "C", "D"):
+            answer = options["ABCD".index(answer.upper())]
+        if answer not in options:
+            return None
+        return {"question": question.strip(), "options": options, "answer": answer}
+
+    def key(self, item):
+        return item["question"]
+
+def format_question(item: dict) -> str:
+    """The plain-text rendering the quiz page and history have always shown."""
+    lines = [item["question"]]
+    lines += [f"{letter}) {option}" for letter, option in zip("ABCD", item["options"])]
+    lines.append(f"Answer: {'ABCD'[item['options'].index(item['answer'])]}) {item['answer']}")
+    return "\n".join(lines)
 
-    response = llm.invoke(messages)
-    return response.content.strip().split("\n\n")  
+async def generate_quiz_questions(pdf_path: str, num_questions: int = 5) -> list:
+    """Return validated questions as {"question", "options", "answer"} dicts."""
+    chunks = await run_in_stage("parse", load_pdf_chunks, pdf_path)
+    # Token-budgeted, de-duplicated context per section; batches run concurrently
+    sections = await pack_sections(chunks, num_questions)
+    return await generate_items(QuizSpec(), sections)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import threading
+
+import numpy as np
+
+from ml.embedder import get_embedder
+from utils.concurrency import run_in_stage
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# Candidates each retriever contributes to fusion
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+# Extra vector candidates fetched when results are filtered to one document
+DOCUMENT_FILTER_FETCH_K = int(os.getenv("DOCUMENT_FILTER_FETCH_K", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "12"))
+
+# A stage that overruns its budget is skipped rather than failing the turn
+VECTOR_BUDGET_MS = int(os.getenv("RETRIEVAL_VECTOR_BUDGET_MS", "500"))
+LEXICAL_BUDGET_MS = int(os.getenv("RETRIEVAL_LEXICAL_BUDGET_MS", "300"))
+RERANK_BUDGET_MS = int(os.getenv("RETRIEVAL_RERANK_BUDGET_MS", "800"))
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                from sentence_transformers import CrossEncoder
+                _reranker = CrossEncoder(RERANKER_MODEL)
+    return _reranker
+
+
+def _allowed_rows(vectorstore, document_id):
+    """Mask of rows in ``document_id``, or None when the docstore cannot answer cheaply."""
+    if document_id is None:
+        return None
+    document_mask = getattr(vectorstore.docstore, "document_mask", None)
+    return document_mask(document_id) if document_mask else None
+
+
+def _document(vectorstore, row):
+    return vectorstore.docstore.search(vectorstore.index_to_docstore_id[row])
+
+
+@timed("vector_search")
+def _vector_rows(vectorstore, vector, k, document_id, mask):
+    fetch = k if document_id is None else max(k, DOCUMENT_FILTER_FETCH_K)
+    _, found = vectorstore.index.search(np.asarray([vector], dtype=np.float32), min(fetch, vectorstore.index.ntotal))
+    rows = [int(row) for row in found[0] if row >= 0]
+    if document_id is None:
+        return rows[:k]
+    if mask is not None:
+        return [row for row in rows if mask[row]][:k]
+    return [row for row in rows if _document(vectorstore, row).metadata.get("document_id") == document_id][:k]
+
+
+@timed("lexical_search")
+def _lexical_rows(vectorstore, question, k, mask):
+    return vectorstore.lexical_index.search(question, k, mask)
+
+
+def fuse(rankings, k=RRF_K):
+    """Reciprocal rank fusion of several ranked row lists."""
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+async def _within_budget(stage: str, budget_ms: int, work):
+    try:
+        return await asyncio.wait_for(work, budget_ms / 1000)
+    except asyncio.TimeoutError:
+        logger.warning("Retrieval stage %s exceeded its %d ms budget", stage, budget_ms)
+        return None
+
+
+@timed("rerank")
+def _rerank(question, documents):
+    scores = get_reranker().predict([(question, document.page_content) for document in documents])
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    return [documents[i] for i in order]
+
+
+async def retrieve(vectorstore, question: str, k: int = RETRIEVAL_K, document_id: str = None):
+    """Top ``k`` chunks for ``question``: BM25 and vector candidates fused by RRF, then optionally reranked.
+
+    Only the chunks that survive fusion are read from the docstore.
+    """
+    lexical = getattr(vectorstore, "lexical_index", None)
+    candidates = max(k, RETRIEVAL_CANDIDATES, RERANK_TOP_N if RERANK_ENABLED else 0)
+    mask = _allowed_rows(vectorstore, document_id)
+    vector = await get_embedder().aembed_query(question)
+
+    # Shielded so the vector search keeps running past its budget: when it is the only ranking left it is awaited
+    vector_search = asyncio.ensure_future(
+        run_in_stage("index", _vector_rows, vectorstore, vector, candidates, document_id, mask))
+    searches = [_within_budget("vector", VECTOR_BUDGET_MS, asyncio.shield(vector_search))]
+    if lexical is not None and (document_id is None or mask is not None):
+        searches.append(_within_budget(
+            "lexical", LEXICAL_BUDGET_MS, run_in_stage("index", _lexical_rows, vectorstore, question, candidates, mask)))
+    rankings = [ranking for ranking in await asyncio.gather(*searches) if ranking]
+    if not rankings:
+        # Never answer from an empty context just because the stages were slow
+        rankings = [await vector_search]
+
+    rows = fuse(rankings)[:RERANK_TOP_N if RERANK_ENABLED else k]
+    documents = [_document(vectorstore, row) for row in rows]
+    if RERANK_ENABLED and len(documents) > 1:
+        reranked = await _within_budget("rerank", RERANK_BUDGET_MS, run_in_stage("index", _rerank, question, documents))
+        documents = reranked or documents
+    return documents[:k]
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import re
+
+from ml import llm
+
+# Items asked for in one call, and how many follow-up calls may fill the gaps a call left
+STRUCTURED_BATCH_SIZE = int(os.getenv("STRUCTURED_BATCH_SIZE", "10"))
+STRUCTURED_MAX_ROUNDS = int(os.getenv("STRUCTURED_MAX_ROUNDS", "3"))
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+class ItemStreamParser:
+    """Pull complete objects out of a streamed ``{"items": [{...}, {...}, ...]}`` response."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = None  # index just inside the items array once it has been seen
+        self.done = False
+
+    def feed(self, text: str):
+        self.buffer += text
+        return list(self._parse(final=False))
+
+    def finish(self):
+        return list(self._parse(final=True))
+
+    def _parse(self, final):
+        if self.pos is None:
+            start = self.buffer.find("[")
+            if start < 0:
+                return
+            self.pos = start + 1
+        while not self.done:
+            self.pos = _SEPARATORS.match(self.buffer, self.pos).end()
+            if self.pos >= len(self.buffer):
+                return
+            if self.buffer[self.pos] == "]":
+                self.done = True
+                return
+            try:
+                item, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not final:
+                    return  # most likely an object that has not finished streaming
+                # Malformed item: resume at the next object, if any
+                next_object = self.buffer.find("{", self.pos + 1)
+                if next_object < 0:
+                    return
+                self.pos = next_object
+                continue
+            self.pos = end
+            yield item
+
+
+def normalize_key(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+class ItemSpec:
+    """How to ask for, validate and de-duplicate one kind of generated item."""
+
+    system_prompt = ""
+
+    def prompt(self, content: str, count: int, avoid, part) -> str:
+        """``part`` is (index, total) over the batches sharing ``content``."""
+        raise NotImplementedError
+
+    def validate(self, raw):
+        """Return the cleaned item, or None if ``raw`` does not satisfy the schema."""
+        raise NotImplementedError
+
+    def key(self, item) -> str:
+        raise NotImplementedError
+
+
+def steering(avoid, part) -> str:
+    """Prompt lines keeping concurrent and follow-up requests from repeating each other."""
+    lines = []
+    index, total = part
+    if total > 1:
+        lines.append(f"This is request {index + 1} of {total} over the same content; "
+                     f"focus on part {index + 1} of {total} of the material.")
+    if avoid:
+        lines.append("Do not repeat any of these existing items:\n" + "\n".join(f"- {key}" for key in avoid))
+    return "\n".join(lines)
+
+
+async def _request(spec: ItemSpec, content: str, count: int, avoid, part):
+    messages = [
+        ("system", spec.system_prompt),
+        ("human", spec.prompt(content, count, avoid, part)),
+    ]
+    parser = ItemStreamParser()
+    items = []
+    async for token in llm.stream(messages, json_mode=True):
+        items.extend(parser.feed(token))
+    items.extend(parser.finish())
+    return items
+
+
+async def _fill_batch(spec: ItemSpec, content: str, count: int, part, accepted: dict):
+    """Generate ``count`` new items into ``accepted`` (shared across batches, keyed for dedup)."""
+    added = []
+    for _ in range(STRUCTURED_MAX_ROUNDS):
+        missing = count - len(added)
+        if missing <= 0:
+            break
+        # Follow-up rounds ask only for what is still missing and steer away from what exists
+        avoid = [spec.key(item) for item in accepted.values()]
+        before = len(added)
+        for raw in await _request(spec, content, missing, avoid, part):
+            item = spec.validate(raw)
+            if item is None:
+                continue
+            key = normalize_key(spec.key(item))
+            if key in accepted or len(added) >= count:
+                continue
+            accepted[key] = item
+            added.append(item)
+        if len(added) == before:
+            break  # the model has nothing new for this context
+    return added
+
+
+async def generate_items(spec: ItemSpec, sections):
+    """Generate items for [(content, count)] sections in concurrent batches; results keep section order."""
+    accepted = {}
+    batches = []
+    for content, count in sections:
+        sizes = [min(STRUCTURED_BATCH_SIZE, count - start) for start in range(0, count, STRUCTURED_BATCH_SIZE)]
+        for index, size in enumerate(sizes):
+            batches.append(_fill_batch(spec, content, size, (index, len(sizes)), accepted))
+    results = await asyncio.gather(*batches)
+    return [item for batch in results for item in batch]
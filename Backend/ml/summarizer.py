@@ -1,29 +1,137 @@
 from ml.loader import load_pdf_chunks
-from ml.vectorstore import create_vectorstore, load_vectorstore
-from langchain_mistralai import ChatMistralAI
+from ml import llm
+from ml.tokens import count_tokens
+from utils.concurrency import run_in_stage
+import asyncio
+import hashlib
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+SUMMARY_MODES = ("auto", "stuff", "map_reduce")
+# Documents above this many tokens are summarized with map-reduce in "auto" mode
+SUMMARY_CONTEXT_TOKENS = int(os.getenv("SUMMARY_CONTEXT_TOKENS", "24000"))
+SUMMARY_GROUP_TOKENS = int(os.getenv("SUMMARY_GROUP_TOKENS", "6000"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
 
-api_key = os.getenv("MISTRAL_API_KEY")
+SYSTEM_PROMPT = "You are an academic assistant that summarizes academic PDF content."
+MAP_PROMPT = "Summarize the following section of an academic document. Keep key definitions, results and formulas:\n\n{text}"
+REDUCE_PROMPT = "Combine the following partial summaries of one academic document into a single coherent summary:\n\n{text}"
 
-llm = ChatMistralAI(
-    model="mistral-large-latest",
-    temperature=0,
-    max_retries=2,
-    api_key=api_key
-)
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-def summarize_text(pdf_path: str) -> str:
-    chunks = load_pdf_chunks(pdf_path)
-    full_text = "\n".join([chunk.page_content for chunk in chunks])
 
-    messages = [
-        ("system", "You are an academic assistant that summarizes academic PDF content."),
+def group_texts(texts, max_tokens):
+    """Pack texts into groups of at most ``max_tokens`` (a single oversized text gets its own group).
+
+    Groups also close at content-defined boundaries once half full, so editing
+    one part of a document only reshapes the groups around the edit and the
+    cached summaries of the rest stay valid.
+    """
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        n = count_tokens(text)
+        if current and current_tokens + n > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += n
+        if current_tokens >= max_tokens // 2 and int(_digest(text)[:8], 16) % 4 == 0:
+            groups.append(current)
+            current, current_tokens = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _summary_messages(prompt_template: str, text: str):
+    return [
+        ("system", SYSTEM_PROMPT),
+        ("human", prompt_template.format(text=text)),
+    ]
+
+
+async def _summarize(prompt_template: str, text: str) -> str:
+    # Each group summary is cached by the LLM gateway under its prompt hash,
+    # so unchanged groups of a re-uploaded document cost nothing
+    return (await llm.generate(_summary_messages(prompt_template, text))).strip()
+
+
+async def _summarize_groups(prompt_template, groups):
+    # Bound the fan-out of a single document on top of the global LLM limit
+    workers = asyncio.Semaphore(SUMMARY_WORKERS)
+
+    async def summarize_group(group):
+        async with workers:
+            return await _summarize(prompt_template, "\n".join(group))
+
+    return list(await asyncio.gather(*(summarize_group(group) for group in groups)))
+
+
+async def _partial_summaries(texts):
+    summaries = await _summarize_groups(MAP_PROMPT, group_texts(texts, SUMMARY_GROUP_TOKENS))
+
+    # Reduce partial summaries level by level until one prompt can hold them all
+    while len(summaries) > 1 and count_tokens("\n\n".join(summaries)) > SUMMARY_CONTEXT_TOKENS:
+        groups = group_texts(summaries, SUMMARY_GROUP_TOKENS)
+        if len(groups) == len(summaries):
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        summaries = await _summarize_groups(REDUCE_PROMPT, groups)
+    return summaries
+
+
+async def map_reduce_summarize(texts) -> str:
+    summaries = await _partial_summaries(texts)
+    if len(summaries) == 1:
+        return summaries[0]
+    return await _summarize(REDUCE_PROMPT, "\n\n".join(summaries))
+
+
+async def _load_texts(pdf_path: str, mode: str):
+    if mode not in SUMMARY_MODES:
+        raise ValueError(f"Unknown summary mode: {mode}")
+
+    chunks = await run_in_stage("parse", load_pdf_chunks, pdf_path)
+    texts = [chunk.page_content for chunk in chunks]
+    use_map_reduce = mode == "map_reduce" or (
+        mode == "auto" and count_tokens("\n".join(texts)) > SUMMARY_CONTEXT_TOKENS
+    )
+    return texts, use_map_reduce
+
+
+def _stuff_messages(texts):
+    full_text = "\n".join(texts)
+    return [
+        ("system", SYSTEM_PROMPT),
         ("human", f"Summarize the following document:\n\n{full_text}")
     ]
 
-    response = llm.invoke(messages)
-    
-    return response.content.strip()
+
+async def summarize_text(pdf_path: str, mode: str = "auto") -> str:
+    texts, use_map_reduce = await _load_texts(pdf_path, mode)
+    if use_map_reduce:
+        return await map_reduce_summarize(texts)
+
+    response = await llm.generate(_stuff_messages(texts))
+
+    return response.strip()
+
+
+async def stream_summary(pdf_path: str, mode: str = "auto"):
+    """Yield the summary as it is generated.
+
+    In map-reduce mode the partial summaries are computed first and only the
+    final reduce step is streamed.
+    """
+    texts, use_map_reduce = await _load_texts(pdf_path, mode)
+
+    if use_map_reduce:
+        summaries = await _partial_summaries(texts)
+        if len(summaries) == 1:
+            yield summaries[0]
+            return
+        messages = _summary_messages(REDUCE_PROMPT, "\n\n".join(summaries))
+    else:
+        messages = _stuff_messages(texts)
+
+    async for token in llm.stream(messages):
+        yield token
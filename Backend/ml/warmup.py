@@ -0,0 +1,80 @@
+import logging
+import os
+
+from ml import llm
+from ml.chat_engine import chat_vectorstore_dir
+from ml.embedder import get_embedder
+from ml.index_manager import index_exists
+from ml.index_registry import get_vectorstore
+from ml.retrieval import RERANK_ENABLED, get_reranker
+from ml.tokens import count_tokens
+from utils import startup
+
+logger = logging.getLogger(__name__)
+
+# Steps run, in order, before the worker accepts traffic; "" boots fastest and
+# leaves every cost to the first request that needs it
+_DEFAULT_STEPS = "embedder,encode,indexes,tokenizer,llm" + (",reranker" if RERANK_ENABLED else "")
+WARMUP_STEPS = [step.strip() for step in os.getenv("WARMUP_STEPS", _DEFAULT_STEPS).split(",") if step.strip()]
+# Most recently written user indexes to load (and memory-map) at startup
+WARMUP_INDEXES = int(os.getenv("WARMUP_INDEXES", "8"))
+
+
+def _load_embedder():
+    get_embedder()
+
+
+def _encode():
+    # The first forward pass allocates buffers and picks kernels; pay for it here
+    get_embedder().embed_documents(["warm up"])
+
+
+def recent_index_paths(limit=WARMUP_INDEXES):
+    if limit <= 0 or not os.path.isdir(chat_vectorstore_dir):
+        return []
+    paths = [entry.path for entry in os.scandir(chat_vectorstore_dir) if entry.is_dir() and index_exists(entry.path)]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    return paths[:limit]
+
+
+def _load_indexes():
+    for path in recent_index_paths():
+        get_vectorstore(path)
+
+
+def _load_tokenizer():
+    count_tokens("warm up")
+
+
+def _build_llm_client():
+    llm.get_client()
+
+
+def _load_reranker():
+    # Loaded lazily, the cross-encoder would blow the first turn's rerank budget
+    get_reranker().predict([("warm up", "warm up")])
+
+
+STEPS = {
+    "embedder": _load_embedder,
+    "encode": _encode,
+    "indexes": _load_indexes,
+    "tokenizer": _load_tokenizer,
+    "llm": _build_llm_client,
+    "reranker": _load_reranker,
+}
+
+
+def warm_up(steps=WARMUP_STEPS):
+    """Run the configured warm-up steps, timing each into the startup breakdown."""
+    for name in steps:
+        step = STEPS.get(name)
+        if step is None:
+            logger.warning("Unknown warm-up step %r; expected one of %s", name, ", ".join(STEPS))
+            continue
+        with startup.phase(f"warmup_{name}"):
+            try:
+                step()
+            except Exception as e:
+                # A cold cache is not a reason to refuse traffic
+                logger.warning("Warm-up step %s failed: %s", name, e)
@@ -0,0 +1,20 @@
+import os
+import sys
+
+# Module-level settings are read at import, so they are set before any app module loads
+os.environ.setdefault("MONGO_MOCK", "1")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("WARMUP_STEPS", "")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from utils import concurrency  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_semaphores(monkeypatch):
+    # asyncio primitives bind to the loop of their first contended use; each test runs its own loop
+    monkeypatch.setattr(concurrency, "_semaphores", {})
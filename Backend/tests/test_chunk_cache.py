@@ -0,0 +1,79 @@
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+from ml import chunk_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_cache, "CHUNK_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _pages():
+    return [
+        Document(page_content="Chapter 1. Motion. Motion. Velocity is distance over time.", metadata={"source": "a.pdf", "page": 0}),
+        Document(page_content="1.2 Kinematics describes motion.", metadata={"source": "a.pdf", "page": 1}),
+    ]
+
+
+def _chunks(pages):
+    first, second = pages[0].page_content, pages[1].page_content
+    return [
+        Document(page_content=first[:18], metadata=dict(pages[0].metadata, start_index=0)),
+        # Repeated text: the span must point at the second occurrence
+        Document(page_content="Motion.", metadata=dict(pages[0].metadata, start_index=19)),
+        Document(page_content=first[18:], metadata=dict(pages[0].metadata, start_index=18)),
+        Document(page_content=second, metadata=dict(pages[1].metadata, start_index=0)),
+        # Not a substring of any page: stored as text
+        Document(page_content="Generated summary", metadata={"source": "a.pdf", "page": 1, "start_index": 5}),
+    ]
+
+
+def test_encode_decode_round_trip():
+    pages = _pages()
+    chunks = _chunks(pages)
+    decoded_pages, decoded_chunks = chunk_cache._decode(chunk_cache._encode(pages, chunks), source="a.pdf")
+    assert [(p.page_content, p.metadata) for p in decoded_pages] == [(p.page_content, p.metadata) for p in pages]
+    assert [c.page_content for c in decoded_chunks] == [c.page_content for c in chunks]
+    assert [c.metadata.get("page") for c in decoded_chunks] == [0, 0, 0, 1, 1]
+    assert decoded_chunks[0].metadata["start_index"] == 0
+    assert decoded_chunks[3].metadata["start_index"] == 0
+    assert decoded_chunks[4].metadata["start_index"] == 5
+
+
+def test_source_is_taken_from_the_reader():
+    pages = _pages()
+    decoded_pages, decoded_chunks = chunk_cache._decode(chunk_cache._encode(pages, _chunks(pages)), source="moved.pdf")
+    assert {d.metadata["source"] for d in decoded_pages + decoded_chunks} == {"moved.pdf"}
+
+
+def test_put_get_and_miss(cache_dir):
+    key = chunk_cache.cache_key("abc", 1000, 200)
+    assert chunk_cache.get(key, source="a.pdf") is None
+    pages = _pages()
+    chunk_cache.put(key, pages, _chunks(pages))
+    cached_pages, cached_chunks = chunk_cache.get(key, source="a.pdf")
+    assert len(cached_pages) == 2 and len(cached_chunks) == 5
+
+
+def test_corrupt_entry_is_dropped(cache_dir):
+    key = chunk_cache.cache_key("abc", 1000, 200)
+    with open(chunk_cache._entry_path(key), "wb") as f:
+        f.write(b"not zlib")
+    assert chunk_cache.get(key, source="a.pdf") is None
+    assert not os.path.exists(chunk_cache._entry_path(key))
+
+
+def test_evict_removes_least_recently_used(cache_dir):
+    pages = _pages()
+    keys = [chunk_cache.cache_key(str(i), 1000, 200) for i in range(3)]
+    for i, key in enumerate(keys):
+        chunk_cache.put(key, pages, _chunks(pages))
+        os.utime(chunk_cache._entry_path(key), (i, i))
+    size = os.path.getsize(chunk_cache._entry_path(keys[0]))
+    chunk_cache.evict(max_bytes=2 * size)
+    assert not os.path.exists(chunk_cache._entry_path(keys[0]))
+    assert all(os.path.exists(chunk_cache._entry_path(key)) for key in keys[1:])
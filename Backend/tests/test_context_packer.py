@@ -0,0 +1,28 @@
+from langchain_core.documents import Document
+
+from ml.context_packer import dedupe_chunks
+
+
+def _chunk(text, page, start):
+    return Document(page_content=text, metadata={"page": page, "start_index": start})
+
+
+def test_splitter_overlap_is_removed():
+    page = "alpha beta gamma delta epsilon"
+    chunks = [_chunk(page[:16], 0, 0), _chunk(page[11:], 0, 11)]
+    assert dedupe_chunks(chunks) == ["alpha beta gamma", "delta epsilon"]
+
+
+def test_text_that_only_looks_like_an_overlap_is_kept():
+    chunks = [
+        _chunk("This chapter discusses results", 0, 0),
+        _chunk("section 2 covers methods", 1, 0),
+        _chunk("Problems for section 1", 1, 30),
+        _chunk("1.2 Kinematics", 2, 0),
+    ]
+    assert dedupe_chunks(chunks) == [chunk.page_content for chunk in chunks]
+
+
+def test_exact_repeats_are_dropped():
+    chunks = [_chunk("Summary", 0, 0), _chunk("Summary", 3, 0)]
+    assert dedupe_chunks(chunks) == ["Summary"]
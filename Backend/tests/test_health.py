@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from database import lifecycle
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+
+    # Without the context manager the lifespan (warm-up, job workers) does not run
+    return TestClient(main.app)
+
+
+def test_healthz(client):
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+
+def test_readyz_reports_ready_when_mongo_answers(client):
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready" and body["mongo"] == "ok"
+    assert "pool" in body and "startup_seconds" in body
+
+
+def test_readyz_reports_unavailable_when_mongo_does_not(client, monkeypatch):
+    async def unreachable(timeout=None):
+        raise TimeoutError("no server")
+
+    monkeypatch.setattr(lifecycle, "ping", unreachable)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["mongo"] == "no server"
+
+
+def test_pool_monitor_counts_checkouts():
+    monitor = lifecycle.PoolMonitor()
+    event = type("Event", (), {"address": ("db", 27017)})()
+    monitor.connection_created(event)
+    monitor.connection_created(event)
+    monitor.connection_checked_out(event)
+    assert monitor.snapshot()["db:27017"]["open"] == 2
+    assert monitor.snapshot()["db:27017"]["checked_out"] == 1
+    monitor.pool_cleared(event)
+    assert monitor.snapshot()["db:27017"]["checked_out"] == 0
@@ -0,0 +1,77 @@
+import asyncio
+import uuid
+
+import pytest
+
+from ml import db
+
+
+def _user():
+    return f"user-{uuid.uuid4().hex}"
+
+
+def _save_entries(user_id, count):
+    async def save():
+        for i in range(count):
+            if i % 2:
+                await db.save_chat_history(user_id, f"question {i}", f"answer {i}")
+            else:
+                await db.save_summary_history(user_id, f"file {i}.pdf", "summary " * i)
+    asyncio.run(save())
+
+
+def _all_pages(user_id, limit, item_type=None):
+    async def walk():
+        pages, cursor = [], None
+        while True:
+            items, cursor = await db.list_history(user_id, item_type=item_type, limit=limit, cursor=cursor)
+            pages.append(items)
+            if cursor is None:
+                return pages
+    return asyncio.run(walk())
+
+
+def test_keyset_pages_cover_every_entry_once_newest_first():
+    user_id = _user()
+    _save_entries(user_id, 7)
+    pages = _all_pages(user_id, limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    items = [item for page in pages for item in page]
+    assert len({item["_id"] for item in items}) == 7
+    keys = [(item["timestamp"], item["_id"]) for item in items]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_pages_carry_list_fields_and_sizes_but_not_bodies():
+    user_id = _user()
+    _save_entries(user_id, 4)
+    items = _all_pages(user_id, limit=10)[0]
+    for item in items:
+        assert item["size"] > 0
+        assert not set(db.BODY_FIELDS.values()) & set(item)
+    summaries = sorted((item for item in items if item["type"] == "summarizer"), key=lambda item: item["file_name"])
+    assert summaries[0]["size"] < summaries[1]["size"]
+
+
+def test_type_filter_and_other_users_are_excluded():
+    user_id = _user()
+    _save_entries(user_id, 5)
+    _save_entries(_user(), 3)
+    items = [item for page in _all_pages(user_id, limit=2, item_type="chat") for item in page]
+    assert len(items) == 2 and {item["type"] for item in items} == {"chat"}
+
+
+def test_history_item_body_is_scoped_to_its_owner():
+    user_id = _user()
+    _save_entries(user_id, 1)
+    item = _all_pages(user_id, limit=1)[0][0]
+    assert asyncio.run(db.get_history_item(user_id, "summarizer", str(item["_id"]))) == ""
+    assert asyncio.run(db.get_history_item(_user(), "summarizer", str(item["_id"]))) is None
+    assert asyncio.run(db.get_history_item(user_id, "summarizer", "not-an-id")) is None
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        db.decode_cursor("garbage")
+    with pytest.raises(ValueError):
+        db.decode_cursor("123-nothex")
@@ -0,0 +1,103 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ml import index_manager
+
+
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [np.frombuffer(hashlib.sha256(text.encode()).digest()[:16], dtype=np.uint8).astype(float).tolist()
+                for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_manager, "get_embedder", HashEmbeddings)
+    return str(tmp_path / "user")
+
+
+def _chunks(document, count):
+    return [Document(page_content=f"{document} chunk {i}", metadata={"page": i}) for i in range(count)]
+
+
+def _generations(index_path):
+    return sorted(name for name in os.listdir(index_path) if name.startswith("gen-"))
+
+
+def _contents(vectorstore):
+    ids = vectorstore.index_to_docstore_id
+    return sorted(vectorstore.docstore.search(ids[row]).page_content for row in range(vectorstore.index.ntotal))
+
+
+def test_commits_advance_the_manifest_and_keep_one_previous_generation(index_path):
+    assert not index_manager.index_exists(index_path)
+    index_manager.add_document(index_path, "a", _chunks("a", 3))
+    assert index_manager.read_manifest(index_path)["generation"] == 1
+
+    index_manager.add_document(index_path, "b", _chunks("b", 2))
+    index_manager.add_document(index_path, "c", _chunks("c", 2))
+    manifest = index_manager.read_manifest(index_path)
+    assert manifest["generation"] == 3
+    assert sorted(manifest["documents"]) == ["a", "b", "c"]
+    assert _generations(index_path) == ["gen-000002", "gen-000003"]
+
+    vectorstore = index_manager.load_index(index_path)
+    assert vectorstore.index.ntotal == 7
+    assert vectorstore.lexical_index.count == 7
+
+
+def test_adding_an_indexed_document_does_not_commit(index_path):
+    first = index_manager.add_document(index_path, "a", _chunks("a", 3))
+    second = index_manager.add_document(index_path, "a", iter(_chunks("a", 3)), current=first)
+    assert second is first
+    assert index_manager.read_manifest(index_path)["generation"] == 1
+
+
+def test_crash_during_save_leaves_the_committed_generation(index_path, monkeypatch):
+    index_manager.add_document(index_path, "a", _chunks("a", 3))
+    save_files = index_manager.save_files
+
+    def crash(directory, vectorstore):
+        save_files(directory, vectorstore)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(index_manager, "save_files", crash)
+    with pytest.raises(OSError):
+        index_manager.add_document(index_path, "b", _chunks("b", 2))
+
+    manifest = index_manager.read_manifest(index_path)
+    assert manifest["generation"] == 1 and list(manifest["documents"]) == ["a"]
+    assert _contents(index_manager.load_index(index_path)) == ["a chunk 0", "a chunk 1", "a chunk 2"]
+
+    # The next commit reuses the number and clears the interrupted generation's leftovers
+    monkeypatch.setattr(index_manager, "save_files", save_files)
+    index_manager.add_document(index_path, "b", _chunks("b", 2))
+    assert index_manager.read_manifest(index_path)["generation"] == 2
+    assert _contents(index_manager.load_index(index_path)) == [
+        "a chunk 0", "a chunk 1", "a chunk 2", "b chunk 0", "b chunk 1"]
+
+
+def test_remove_document(index_path):
+    vectorstore = index_manager.add_document(index_path, "a", _chunks("a", 3))
+    vectorstore = index_manager.add_document(index_path, "b", _chunks("b", 2), current=vectorstore)
+
+    assert index_manager.remove_document(index_path, "missing", current=vectorstore) is None
+    vectorstore = index_manager.remove_document(index_path, "a", current=vectorstore)
+    assert _contents(vectorstore) == ["b chunk 0", "b chunk 1"]
+    assert list(index_manager.read_manifest(index_path)["documents"]) == ["b"]
+
+
+def test_stale_current_is_reloaded(index_path):
+    stale = index_manager.add_document(index_path, "a", _chunks("a", 1))
+    # Another writer commits after ``stale`` was loaded
+    index_manager.add_document(index_path, "b", _chunks("b", 1))
+    vectorstore = index_manager.add_document(index_path, "c", _chunks("c", 1), current=stale)
+    assert _contents(vectorstore) == ["a chunk 0", "b chunk 0", "c chunk 0"]
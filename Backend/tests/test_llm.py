@@ -0,0 +1,106 @@
+import asyncio
+
+import httpx
+import pytest
+
+from ml import llm
+from ml.fake_llm import FAKE_LLM_RESPONSE, FakeChatModel
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(llm, "LLM_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(llm, "LLM_RETRY_MAX_SECONDS", 0.01)
+
+    def install(**kwargs):
+        model = FakeChatModel(latency_ms=0, jitter_ms=0, token_ms=0, seed=0, **kwargs)
+        monkeypatch.setattr(llm, "_clients", (model, model))
+        return model
+
+    return install
+
+
+def _http_error(status, headers=None):
+    request = httpx.Request("POST", "http://provider.test")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request, headers=headers))
+
+
+def test_backoff_is_jittered_below_the_exponential_cap(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_RETRY_BASE_SECONDS", 0.5)
+    monkeypatch.setattr(llm, "LLM_RETRY_MAX_SECONDS", 8)
+    delays = [llm._backoff_seconds(2, _http_error(503)) for _ in range(200)]
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert all(llm._backoff_seconds(10, _http_error(503)) <= 8 for _ in range(50))
+
+
+def test_backoff_honours_retry_after_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(llm, "LLM_RETRY_MAX_SECONDS", 8)
+    assert llm._backoff_seconds(0, _http_error(429, {"retry-after": "3"})) == 3
+    assert llm._backoff_seconds(0, _http_error(429, {"retry-after": "60"})) == 8
+    assert llm._backoff_seconds(0, _http_error(429, {"retry-after": "soon"})) < 1
+
+
+def test_retryable_errors():
+    assert llm._retryable(_http_error(429))
+    assert llm._retryable(_http_error(503))
+    assert llm._retryable(httpx.ConnectError("refused"))
+    assert not llm._retryable(_http_error(400))
+    assert not llm._retryable(ValueError("bad"))
+
+
+def test_generate_returns_the_fake_completion(fake_client):
+    model = fake_client()
+    assert asyncio.run(llm.generate([("human", "hi")])) == FAKE_LLM_RESPONSE
+    assert model.calls == 1
+
+
+def test_generate_retries_transient_errors_then_gives_up(fake_client):
+    model = fake_client(error_rate=1.0, error_status=503)
+    retries = llm.llm_retries.value()
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(llm.generate([("human", "hi")]))
+    assert model.calls == llm.LLM_MAX_RETRIES + 1
+    assert llm.llm_retries.value() == retries + llm.LLM_MAX_RETRIES
+
+
+def test_generate_does_not_retry_client_errors(fake_client):
+    model = fake_client(error_rate=1.0, error_status=400)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(llm.generate([("human", "hi")]))
+    assert model.calls == 1
+
+
+def test_generate_recovers_after_a_transient_error(fake_client):
+    model = fake_client(error_rate=1.0, error_status=429)
+    original = model._respond
+
+    async def fail_once():
+        if model.calls == 1:
+            model.error_rate = 0.0
+        return await original()
+
+    model._respond = fail_once
+    assert asyncio.run(llm.generate([("human", "hi")])) == FAKE_LLM_RESPONSE
+    assert model.calls == 2 and model.failures == 1
+
+
+def test_stream_yields_tokens_and_retries_before_the_first_one(fake_client):
+    model = fake_client(error_rate=1.0, error_status=503)
+    original = model._respond
+
+    async def fail_once():
+        if model.calls == 1:
+            model.error_rate = 0.0
+        return await original()
+
+    model._respond = fail_once
+
+    async def collect():
+        return [token async for token in llm.stream([("human", "hi")])]
+
+    assert "".join(asyncio.run(collect())) == FAKE_LLM_RESPONSE
+    assert model.failures == 1
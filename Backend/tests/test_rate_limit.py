@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from utils import rate_limit
+from utils.concurrency import STAGE_LIMITS, stage_limit
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_buckets", type(rate_limit._buckets)())
+    monkeypatch.setattr(rate_limit, "_queue", rate_limit._SlotQueue())
+
+
+def _request(host="10.0.0.1", forwarded=None):
+    headers = {"x-forwarded-for": forwarded} if forwarded else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=host))
+
+
+def test_token_bucket_allows_burst_then_refills():
+    bucket = rate_limit.TokenBucket(rate_per_second=1.0, capacity=2, now=0.0)
+    assert bucket.take(0.0) == 0
+    assert bucket.take(0.0) == 0
+    assert bucket.take(0.0) == pytest.approx(1.0)
+    assert bucket.take(0.5) == pytest.approx(0.5)
+    assert bucket.take(1.0) == 0
+
+
+def test_rate_limit_rejects_with_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_PER_MINUTE", 6.0)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_BURST", 1)
+    rate_limit.check_rate_limit("user:a")
+    with pytest.raises(HTTPException) as error:
+        rate_limit.check_rate_limit("user:a")
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) == 10
+    # Callers have separate buckets
+    rate_limit.check_rate_limit("user:b")
+
+
+def test_rate_limit_evicts_least_recently_used_keys(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_MAX_KEYS", 2)
+    for key in ("a", "b", "c"):
+        rate_limit.check_rate_limit(key)
+    assert list(rate_limit._buckets) == ["b", "c"]
+
+
+def test_client_address_uses_trusted_proxy_hop(monkeypatch):
+    request = _request(host="10.0.0.1", forwarded="203.0.113.7, 198.51.100.2")
+    assert rate_limit.client_address(request) == "10.0.0.1"
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 1)
+    assert rate_limit.client_address(request) == "198.51.100.2"
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 2)
+    assert rate_limit.client_address(request) == "203.0.113.7"
+    # Fewer hops than configured: the header cannot be trusted
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 3)
+    assert rate_limit.client_address(request) == "10.0.0.1"
+
+
+def test_admit_request_keys_anonymous_callers_by_address(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_BURST", 1)
+    rate_limit.admit_request(_request(host="10.0.0.1"), None)
+    rate_limit.admit_request(_request(host="10.0.0.2"), None)
+    rate_limit.admit_request(_request(host="10.0.0.1"), {"_id": "u1"})
+    with pytest.raises(HTTPException):
+        rate_limit.admit_request(_request(host="10.0.0.1"), None)
+
+
+def test_capacity_is_not_checked_while_slots_are_free():
+    rate_limit._queue.waiting = 10_000
+    rate_limit.check_capacity(deadline_seconds=0)
+
+
+def test_capacity_sheds_when_queue_is_full_or_deadline_cannot_be_met(monkeypatch):
+    async def scenario():
+        semaphore = stage_limit("llm")
+        for _ in range(STAGE_LIMITS["llm"]):
+            await semaphore.acquire()
+
+        rate_limit._queue.service_seconds = 1.0
+        rate_limit.check_capacity(deadline_seconds=60)
+
+        with pytest.raises(HTTPException) as deadline:
+            rate_limit.check_capacity(deadline_seconds=0.0001)
+        assert deadline.value.status_code == 429
+        assert int(deadline.value.headers["Retry-After"]) >= 1
+
+        monkeypatch.setattr(rate_limit, "LLM_MAX_QUEUE", 1)
+        rate_limit._queue.waiting = 1
+        with pytest.raises(HTTPException) as full:
+            rate_limit.check_capacity(deadline_seconds=60)
+        assert full.value.status_code == 429
+
+    before = {reason: rate_limit.rejections.value(reason=reason) for reason in ("deadline", "queue_full")}
+    asyncio.run(scenario())
+    assert rate_limit.rejections.value(reason="deadline") == before["deadline"] + 1
+    assert rate_limit.rejections.value(reason="queue_full") == before["queue_full"] + 1
+
+
+def test_llm_slot_waits_instead_of_shedding():
+    async def scenario():
+        order = []
+
+        async def call(name):
+            async with rate_limit.llm_slot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call(i) for i in range(STAGE_LIMITS["llm"] + 3)))
+        return order
+
+    assert len(asyncio.run(scenario())) == STAGE_LIMITS["llm"] + 3
+    assert rate_limit._queue.waiting == 0
@@ -0,0 +1,44 @@
+import json
+
+from ml.structured_output import ItemStreamParser
+
+ITEMS = [{"question": "What is 2 + 2?", "options": ["3", "4"]}, {"question": "Brackets ] and } in text?", "answer": "yes"}]
+RESPONSE = json.dumps({"items": ITEMS})
+
+
+def test_items_are_emitted_as_soon_as_they_are_complete():
+    parser = ItemStreamParser()
+    emitted = []
+    for i in range(len(RESPONSE)):
+        emitted.extend(parser.feed(RESPONSE[i]))
+        if i < RESPONSE.index("}"):
+            assert emitted == []
+    emitted.extend(parser.finish())
+    assert emitted == ITEMS
+    assert parser.done
+
+
+def test_whole_response_in_one_piece():
+    parser = ItemStreamParser()
+    assert parser.feed(RESPONSE) == ITEMS
+    assert parser.finish() == []
+
+
+def test_text_before_the_array_is_ignored():
+    parser = ItemStreamParser()
+    assert parser.feed('Sure! {"items": ') == []
+    assert parser.feed('[{"a": 1}, {"a"') == [{"a": 1}]
+    assert parser.feed(': 2}]}') == [{"a": 2}]
+
+
+def test_malformed_item_is_skipped_at_finish():
+    parser = ItemStreamParser()
+    assert parser.feed('{"items": [{"a": 1}, {"a": oops}, {"a": 3}') == [{"a": 1}]
+    assert parser.finish() == [{"a": 3}]
+
+
+def test_truncated_response_keeps_the_complete_items():
+    parser = ItemStreamParser()
+    parser.feed('{"items": [{"a": 1}, {"a": 2')
+    assert parser.finish() == []
+    assert not parser.done
@@ -1,20 +1,57 @@
 import bcrypt
 import jwt
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from bson.errors import InvalidId
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database.user import get_user_by_id
+from database.user import get_user_profile
+from utils.concurrency import STAGE_LIMITS, pending, run_in_stage
+from utils.metrics import Counter, record_cache
 
 JWT_SECRET = "supersecret"  # replace with os.getenv("JWT_SECRET")
 JWT_EXPIRY_MINUTES = 60
+# Changing the cost factor takes effect for existing users at their next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hash/verify calls allowed to wait for the password pool before new ones are turned away
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+# Per-process cache of user profiles; other workers see a change within the TTL
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+password_rejections = Counter("ai_tutor_password_hash_rejected_total", "Password hash/verify calls shed by admission control.")
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode(), hashed.encode())
 
+def needs_rehash(hashed: str) -> bool:
+    # bcrypt hashes look like $2b$12$<salt+hash>; the second field is the cost
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+async def _run_password_work(fn, *args):
+    if pending("password") >= STAGE_LIMITS["password"] + PASSWORD_HASH_MAX_QUEUE:
+        password_rejections.inc()
+        raise HTTPException(status_code=503, detail="Too many sign-in attempts, please retry shortly",
+                            headers={"Retry-After": "1"})
+    return await run_in_stage("password", fn, *args)
+
+async def ahash_password(password: str) -> str:
+    return await _run_password_work(hash_password, password)
+
+async def averify_password(password: str, hashed: str) -> bool:
+    return await _run_password_work(verify_password, password, hashed)
+
 def create_token(user_id: str) -> str:
     payload = {
         "sub": user_id,
@@ -31,10 +68,56 @@ def decode_token(token: str) -> str:
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    user_id = decode_token(token)
-    user = await get_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+_user_cache = OrderedDict()  # user_id -> (expires_at, profile)
+_user_cache_lock = threading.Lock()
+
+def _cached_user(user_id: str):
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _user_cache.move_to_end(user_id)
+            return dict(entry[1])
+        _user_cache.pop(user_id, None)
+        return None
+
+def _cache_user(user_id: str, user: dict):
+    with _user_cache_lock:
+        _user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL_SECONDS, dict(user))
+        _user_cache.move_to_end(user_id)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+def invalidate_user(user_id) -> None:
+    """Drop a cached profile after the user document changed."""
+    with _user_cache_lock:
+        _user_cache.pop(str(user_id), None)
+
+async def load_user(user_id: str):
+    user = _cached_user(user_id)
+    record_cache("user", user is not None)
+    if user is None:
+        try:
+            user = await get_user_profile(user_id)
+        except InvalidId:
+            user = None
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        _cache_user(user_id, user)
     return user
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """The user's profile (without the password hash), cached briefly per process."""
+    return await load_user(decode_token(credentials.credentials))
+
+async def get_current_claims(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Token-only authentication for read endpoints that need nothing but the user id.
+
+    Skips the user lookup entirely, so a deleted account keeps read access
+    until its token expires.
+    """
+    return {"_id": decode_token(credentials.credentials)}
+
+async def get_optional_user(credentials: HTTPAuthorizationCredentials = Depends(optional_security)):
+    if credentials is None:
+        return None
+    return await get_current_user(credentials)
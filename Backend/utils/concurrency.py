@@ -0,0 +1,60 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from utils.metrics import register_gauge
+
+# CPU-bound stages run on their own bounded thread pools so a burst of PDF
+# parsing or index building (the "parse" pool) cannot take the threads that
+# index loads and searches ("index") need, and neither ever runs on the
+# event loop. LLM calls are I/O-bound and use the
+# async client, capped by a semaphore instead of a pool.
+STAGE_LIMITS = {
+    "parse": int(os.getenv("PARSE_CONCURRENCY", str(os.cpu_count() or 2))),
+    "index": int(os.getenv("INDEX_CONCURRENCY", "2")),
+    "llm": int(os.getenv("LLM_CONCURRENCY", "16")),
+    # bcrypt is deliberately slow CPU work; its own small pool keeps login storms from starving parsing
+    "password": int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 2)))),
+}
+
+_executors = {
+    name: ThreadPoolExecutor(max_workers=STAGE_LIMITS[name], thread_name_prefix=f"{name}-stage")
+    for name in ("parse", "index", "password")
+}
+_semaphores = {}
+# Work submitted to each stage that has not finished yet (queued or running)
+_pending = {name: 0 for name in STAGE_LIMITS}
+
+register_gauge("ai_tutor_stage_pending", "Work queued or running per stage.",
+               lambda: {(("stage", name),): count for name, count in _pending.items()})
+
+
+def pending(stage: str) -> int:
+    return _pending[stage]
+
+
+@contextlib.contextmanager
+def track(stage: str):
+    _pending[stage] += 1
+    try:
+        yield
+    finally:
+        _pending[stage] -= 1
+
+
+async def run_in_stage(stage: str, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context so spans recorded in the thread land in its request trace
+    context = contextvars.copy_context()
+    with track(stage):
+        return await loop.run_in_executor(_executors[stage], partial(context.run, fn, *args, **kwargs))
+
+
+def stage_limit(stage: str) -> asyncio.Semaphore:
+    semaphore = _semaphores.get(stage)
+    if semaphore is None:
+        semaphore = _semaphores[stage] = asyncio.Semaphore(STAGE_LIMITS[stage])
+    return semaphore
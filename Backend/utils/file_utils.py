@@ -0,0 +1,57 @@
+import hashlib
+import os
+import tempfile
+
+import aiofiles
+from fastapi import HTTPException
+
+HASH_BLOCK_SIZE = 1024 * 1024
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _too_large(max_bytes: int):
+    return HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+
+async def save_upload_stream(file, dest_dir: str, max_bytes: int = MAX_UPLOAD_BYTES):
+    """Write an UploadFile into a temp file in ``dest_dir`` chunk by chunk.
+
+    Returns (temp path, sha256, size). The caller moves the temp file into
+    place with os.replace, so readers never see a partially written file.
+    """
+    # Reject early when the client told us the size up front
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise _too_large(max_bytes)
+
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+    os.close(fd)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return tmp_path, digest.hexdigest(), size
@@ -0,0 +1,227 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+# In-process metrics rendered in the Prometheus text format by /metrics, plus
+# a per-request trace of the spans a request went through, logged as one JSON
+# line when the request finishes.
+TRACE_LOG_ENABLED = os.getenv("TRACE_LOG_ENABLED", "1") == "1"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+trace_logger = logging.getLogger("ai_tutor.trace")
+if TRACE_LOG_ENABLED and not trace_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_logger.addHandler(_handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+_registry = []
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """A gauge whose samples come from ``collect()`` at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name, help_text, collect):
+        super().__init__(name, help_text)
+        self.collect = collect
+
+    def render(self):
+        try:
+            samples = self.collect()
+        except Exception:
+            return []
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        return self._header() + [
+            f"{self.name}{_format_labels(_label_key(dict(labels)))} {value}" for labels, value in samples.items()
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            # [cumulative bucket counts..., sum, count]
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = [(key, state[:-2], state[-2], state[-1]) for key, state in self._values.items()]
+        for key, counts, total, count in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+stage_seconds = Histogram("ai_tutor_stage_duration_seconds", "Time spent in each processing stage.")
+request_seconds = Histogram("ai_tutor_http_request_duration_seconds", "HTTP request latency by route.")
+llm_tokens = Counter("ai_tutor_llm_tokens_total", "LLM tokens by direction (prompt/completion).")
+cache_requests = Counter("ai_tutor_cache_requests_total", "Cache lookups by cache and result (hit/miss).")
+
+
+def _hit_ratios():
+    ratios = {}
+    with cache_requests._lock:
+        items = list(cache_requests._values.items())
+    totals = {}
+    for key, value in items:
+        labels = dict(key)
+        hits, count = totals.get(labels["cache"], (0, 0))
+        totals[labels["cache"]] = (hits + (value if labels["result"] == "hit" else 0), count + value)
+    for cache, (hits, count) in totals.items():
+        ratios[(("cache", cache),)] = hits / count if count else 0
+    return ratios
+
+
+Gauge("ai_tutor_cache_hit_ratio", "Fraction of cache lookups that hit, since start.", _hit_ratios)
+
+
+def register_gauge(name, help_text, collect):
+    """Expose ``collect()`` (a number, or {((label, value), ...): number}) as a gauge."""
+    return Gauge(name, help_text, collect)
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_tokens(prompt_tokens: int, completion_tokens: int):
+    llm_tokens.inc(prompt_tokens, direction="prompt")
+    llm_tokens.inc(completion_tokens, direction="completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["prompt_tokens"] += prompt_tokens
+        trace["completion_tokens"] += completion_tokens
+
+
+@contextlib.contextmanager
+def span(stage: str, **labels):
+    """Time a block into the stage histogram and the current request's trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["spans"].append(dict(labels, stage=stage, ms=round(elapsed * 1000, 2)))
+
+
+def timed(stage: str, **labels):
+    """Decorator form of ``span`` for plain and async functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, **labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_trace(method: str, path: str):
+    trace = {
+        "request_id": uuid.uuid4().hex,
+        "method": method,
+        "path": path,
+        "spans": [],
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "started": time.perf_counter(),
+    }
+    return trace, _current_trace.set(trace)
+
+
+def finish_trace(trace, token, route: str, status: int):
+    _current_trace.reset(token)
+    elapsed = time.perf_counter() - trace.pop("started")
+    request_seconds.observe(elapsed, method=trace["method"], route=route, status=status)
+    if TRACE_LOG_ENABLED:
+        trace_logger.info(json.dumps(dict(trace, route=route, status=status, ms=round(elapsed * 1000, 2))))
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,139 @@
+import contextlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+from utils.concurrency import STAGE_LIMITS, stage_limit
+from utils.metrics import Counter, register_gauge
+
+# Admission control for LLM-backed endpoints, in two layers:
+#  - a token bucket per caller (user id, or client IP when anonymous) bounds
+#    how often one caller may start LLM work;
+#  - every LLM call takes one of STAGE_LIMITS["llm"] slots (LLM_CONCURRENCY,
+#    sized to the provider quota) and waits for one in a queue. A request is
+#    shed with 429 + Retry-After at admission, before any of its LLM calls,
+#    when the queue is full or the expected wait exceeds its deadline; once
+#    admitted, a multi-call pipeline runs to completion. Background jobs are
+#    never shed and simply wait.
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+# Behind nginx/a CDN every anonymous caller shares the proxy's address. Set to
+# the number of trusted proxies in front of the app to key anonymous callers on
+# the X-Forwarded-For entry the outermost one appended; leave at 0 when clients
+# connect directly (or when uvicorn runs with --proxy-headers, which already
+# rewrites the client address), as the header is client-controlled otherwise.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+LLM_QUEUE_DEADLINE_SECONDS = float(os.getenv("LLM_QUEUE_DEADLINE_SECONDS", "10"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+
+rejections = Counter("ai_tutor_admission_rejections_total", "Requests shed by admission control, by reason.")
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: int, now: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Spend one token; returns 0 on success, else the seconds until one is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+# caller key -> bucket, least recently used first
+_buckets = OrderedDict()
+_buckets_lock = threading.Lock()
+
+
+def _reject(reason: str, retry_after: float, detail: str):
+    rejections.inc(reason=reason)
+    raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+def check_rate_limit(key: str):
+    if RATE_LIMIT_PER_MINUTE <= 0:
+        return
+    now = time.monotonic()
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_BURST, now)
+        _buckets.move_to_end(key)
+        while len(_buckets) > RATE_LIMIT_MAX_KEYS:
+            _buckets.popitem(last=False)
+        wait = bucket.take(now)
+    if wait > 0:
+        _reject("rate_limit", wait, "Too many requests, please slow down")
+
+
+def client_address(request: Request) -> str:
+    if TRUSTED_PROXY_HOPS > 0:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+class _SlotQueue:
+    def __init__(self):
+        self.waiting = 0
+        # Moving average of how long a call holds its slot, for wait estimates
+        self.service_seconds = 1.0
+
+    def expected_wait(self) -> float:
+        return (self.waiting + 1) * self.service_seconds / STAGE_LIMITS["llm"]
+
+    def observe(self, seconds: float):
+        self.service_seconds = 0.8 * self.service_seconds + 0.2 * seconds
+
+
+_queue = _SlotQueue()
+
+register_gauge("ai_tutor_llm_queue_waiting", "LLM calls waiting for a concurrency slot.", lambda: _queue.waiting)
+
+
+def check_capacity(deadline_seconds: float = LLM_QUEUE_DEADLINE_SECONDS):
+    """Shed new LLM work when the slot queue is full or could not start it within the deadline."""
+    if not stage_limit("llm").locked():
+        return
+    expected = _queue.expected_wait()
+    if _queue.waiting >= LLM_MAX_QUEUE:
+        _reject("queue_full", expected, "The service is busy, please retry shortly")
+    if expected > deadline_seconds:
+        _reject("deadline", expected, "The service is busy, please retry shortly")
+
+
+def admit_request(request: Request, user, queue: bool = True):
+    """Entry check for LLM-backed routes: per-caller rate limit, then (``queue``) current capacity."""
+    key = f"user:{user['_id']}" if user else f"ip:{client_address(request)}"
+    check_rate_limit(key)
+    if queue:
+        check_capacity()
+
+
+@contextlib.asynccontextmanager
+async def llm_slot():
+    """Hold one LLM concurrency slot; admission already decided whether the caller may wait for it."""
+    semaphore = stage_limit("llm")
+    _queue.waiting += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _queue.waiting -= 1
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        semaphore.release()
+        _queue.observe(time.monotonic() - started)
@@ -0,0 +1,37 @@
+import contextlib
+import json
+import logging
+import time
+
+from utils.metrics import register_gauge
+
+# uvicorn configures this logger at INFO, so the breakdown shows up next to its own startup lines
+logger = logging.getLogger("uvicorn.error")
+
+# phase -> seconds, in the order the phases ran
+_phases = {}
+
+
+def record(phase: str, seconds: float):
+    _phases[phase] = round(seconds, 4)
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def breakdown():
+    return dict(_phases, total=round(sum(_phases.values()), 4))
+
+
+def report():
+    logger.info("Startup breakdown (seconds): %s", json.dumps(breakdown()))
+
+
+register_gauge("ai_tutor_startup_phase_seconds", "Time this worker spent in each startup phase.",
+               lambda: {(("phase", name),): seconds for name, seconds in _phases.items()})
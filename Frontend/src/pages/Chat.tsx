@@ -49,10 +49,16 @@ const Chat = () => {
         method: "POST",
         headers: {
           "Content-Type": "application/x-www-form-urlencoded",
+          Authorization: `Bearer ${localStorage.getItem("token")}`,
         },
         body: new URLSearchParams({ query: inputMessage }),
       });
 
+      if (res.status === 401) {
+        navigate("/login");
+        return;
+      }
+
       const data = await res.json();
 
       const aiContent = typeof data.response === "object" ? data.response.content : data.response;
@@ -99,9 +105,17 @@ const Chat = () => {
     try {
       const res = await fetch("http://localhost:8000/chat/upload", {
         method: "POST",
+        headers: {
+          Authorization: `Bearer ${localStorage.getItem("token")}`,
+        },
         body: formData,
       });
 
+      if (res.status === 401) {
+        navigate("/login");
+        return;
+      }
+
       const data = await res.json();
       console.log("Upload Response:", data);
       alert("PDF uploaded successfully for chat context.");
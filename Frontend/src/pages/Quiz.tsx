@@ -33,15 +33,20 @@ const Quiz = () => {
 
     const formData = new FormData();
     formData.append("file", file);
+    // Upload and generation must carry the same identity so the document resolves
+    const token = localStorage.getItem("token");
+    const authHeaders: Record<string, string> = token ? { Authorization: `Bearer ${token}` } : {};
 
     try {
       // Upload the file
       const uploadRes = await fetch("http://localhost:8000/upload", {
         method: "POST",
         body: formData,
+        headers: authHeaders,
       });
 
       if (!uploadRes.ok) throw new Error("Upload failed");
+      const { document_id: documentId } = await uploadRes.json();
 
       // Simulate progress
       let progress = 0;
@@ -56,10 +61,11 @@ const Quiz = () => {
         const quizRes = await fetch("http://localhost:8000/quiz", {
           method: "POST",
           headers: {
+            ...authHeaders,
             "Content-Type": "application/x-www-form-urlencoded",
           },
           body: new URLSearchParams({
-            content: "uploaded", // dummy value; backend uses last uploaded file
+            document_id: documentId,
             num_questions: "10",
           }),
         });
@@ -34,14 +34,19 @@ const Summarizer = () => {
 
     const formData = new FormData();
     formData.append("file", file);
+    // Upload and generation must carry the same identity so the document resolves
+    const token = localStorage.getItem("token");
+    const authHeaders: Record<string, string> = token ? { Authorization: `Bearer ${token}` } : {};
 
     try {
       const uploadRes = await fetch("http://localhost:8000/upload", {
         method: "POST",
         body: formData,
+        headers: authHeaders,
       });
 
       if (!uploadRes.ok) throw new Error("Upload failed");
+      const { document_id: documentId } = await uploadRes.json();
 
       let progress = 0;
       const interval = setInterval(() => {
@@ -54,10 +59,10 @@ const Summarizer = () => {
         const summarizeRes = await fetch("http://localhost:8000/summarize", {
           method: "POST",
           headers: {
-            "Authorization": `Bearer ${localStorage.getItem("token")}`,
+            ...authHeaders,
             "Content-Type": "application/x-www-form-urlencoded",
           },
-          body: new URLSearchParams({ content: "uploaded" }),
+          body: new URLSearchParams({ document_id: documentId }),
         });
 
         if (!summarizeRes.ok) throw new Error("Summarization failed");